@@ -1,62 +1,96 @@
 import json
+import multiprocessing
 import re 
 
+try:
+    import orjson  # Optional: faster JSON parsing
+except ImportError:
+    orjson = None
+
+def _loads(raw):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 def load_recipes(filepath):
     """Load recipes from a JSON file."""
-    with open(filepath, 'r') as file:
-        data = json.load(file)
+    with open(filepath, 'rb') as file:
+        data = _loads(file.read())
     return data['recipes']
 
+def find_terms(terms, text):
+    """Return the subset of terms that occur in text, scanning the text once"""
+    terms = set(terms)
+    if not terms:
+        return set()
+    # Zero-width lookahead tries every position, longest alternative first,
+    # so overlapping and nested terms ("tomato" in "tomato sauce") are all seen
+    alternation = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    hits = set(re.findall(f"(?=({alternation}))", text))
+    return {t for t in terms if t in hits or any(h.startswith(t) for h in hits)}
+
 def check_ingredient_coverage(recipe):
     """Check if the graph ingredients appear in text"""
     text = recipe['text'].lower()
     graph_ingredients = [ing['name'].lower() for ing in recipe['graph']['ingredients']]
 
-    issues = []
-    for ingredient in graph_ingredients:
-        # Handle plural forms by checking both singular and plural
-        if ingredient not in text and ingredient + 's' not in text:# 
-            issues.append(f"Ingredient '{ingredient}' not found in text.")
-    return issues
+    # Substring match, so plural forms ("onions") are covered by the singular
+    found = find_terms(graph_ingredients, text)
+    return [
+        f"Ingredient '{ingredient}' not found in text."
+        for ingredient in graph_ingredients if ingredient not in found
+    ]
 
 def check_action_coverage(recipe):
     """Check if action verbs appear in text"""
     text = recipe['text'].lower()
     action_verbs = [action['verb'].lower() for action in recipe['graph']['actions']]        
 
-    issues = []
-    for verb in action_verbs:
-        if verb not in text:
-            issues.append(f"Action verb '{verb}' not found in text.")
-    return issues
+    found = find_terms(action_verbs, text)
+    return [
+        f"Action verb '{verb}' not found in text."
+        for verb in action_verbs if verb not in found
+    ]
+
+_VALID_ROLES = ('input', 'output')
 
 def check_graph_structure(recipe):
     """Validate bipartite graph structure"""
     issues = []
 
-    # Get all valid node IDs
-    ingredient_ids = {ing['id'] for ing in recipe['graph']['ingredients']}
-    action_ids = {action['id'] for action in recipe['graph']['actions']}
+    # Map every node ID to its kind in a single lookup table
+    node_kind = {}
+    for ing in recipe['graph']['ingredients']:
+        node_kind[ing['id']] = 'ing'
+    for action in recipe['graph']['actions']:
+        node_kind[action['id']] = 'act'
 
     # Check edges are action to ingredient
     for edge in recipe['graph']['edges']:
         src, tgt = edge['source'], edge['target']
-        if src in ingredient_ids:
+        if node_kind.get(src) == 'ing':
             issues.append(f"Edge source '{src}' is an ingredient, should be an action.")
-        if tgt in action_ids:
+        if node_kind.get(tgt) == 'act':
             issues.append(f"Edge target '{tgt}' is an action, should be an ingredient.")
 
         # Check role is valid
-        if edge['role'] not in ['input', 'output']:
+        if edge['role'] not in _VALID_ROLES:
             issues.append(f"Edge role '{edge['role']}' is invalid. Must be 'input' or 'output'.")
 
     return issues
 
 def validate_recipe(recipe):
-    """Run all validation checks on a recipe"""
-    print(f"\n{'='*60}")
-    print(f"Validating: {recipe['name']} (ID: {recipe['id']})")
-    print(f"{'='*60}")
+    """Run all validation checks on a recipe.
+
+    Returns (name, all_passed, report) instead of printing, so recipes
+    can be validated in worker processes and reported in order.
+    """
+    report = [
+        f"\n{'='*60}",
+        f"Validating: {recipe['name']} (ID: {recipe['id']})",
+        f"{'='*60}",
+    ]
     
     all_passed = True
     
@@ -71,22 +105,31 @@ def validate_recipe(recipe):
         issues = check_func(recipe)
         if issues:
             all_passed = False
-            print(f"\n❌ {check_name} FAILED:")
+            report.append(f"\n❌ {check_name} FAILED:")
             for issue in issues:
-                print(f"   • {issue}")
+                report.append(f"   • {issue}")
         else:
-            print(f"✅ {check_name} passed")
+            report.append(f"✅ {check_name} passed")
     
-    return all_passed
+    return recipe['name'], all_passed, "\n".join(report)
+
+# Below this many recipes, process pool startup costs more than it saves
+PARALLEL_THRESHOLD = 32
 
 if __name__ == "__main__":
     recipes = load_recipes("./data/recipes.json")
     
     print(f"Found {len(recipes)} recipe(s) to validate\n")
     
+    if len(recipes) > PARALLEL_THRESHOLD:
+        with multiprocessing.Pool() as pool:
+            results = pool.map(validate_recipe, recipes)
+    else:
+        results = [validate_recipe(recipe) for recipe in recipes]
+    
     all_valid = True
-    for recipe in recipes:
-        valid = validate_recipe(recipe)
+    for _name, valid, report in results:
+        print(report)
         if not valid:
             all_valid = False
     
@@ -95,4 +138,4 @@ if __name__ == "__main__":
         print("✅ ALL RECIPES VALID")
     else:
         print("❌ SOME RECIPES HAVE ISSUES - Review above")
-    print(f"{'='*60}")
\ No newline at end of file
+    print(f"{'='*60}")
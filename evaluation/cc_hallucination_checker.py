@@ -1,7 +1,8 @@
 """Hallucination detection for recipe adaptations."""
+from utils.keyword_scan import find_keywords, get_keyword_matcher
 
 
-def check_constraint_violation(adapted_text, constraint, forbidden_ingredients):
+def check_constraint_violation(adapted_text, constraint, forbidden_ingredients, adapted_lower=None):
     """
     Check if adapted recipe violates constraint by using forbidden ingredients.
     
@@ -9,6 +10,7 @@ def check_constraint_violation(adapted_text, constraint, forbidden_ingredients):
         adapted_text: Generated recipe text (string)
         constraint: Constraint name (e.g., "vegetarian")
         forbidden_ingredients: List of forbidden ingredient names (lowercase)
+        adapted_lower: Optional precomputed adapted_text.lower()
     
     Returns:
         dict: {
@@ -17,12 +19,12 @@ def check_constraint_violation(adapted_text, constraint, forbidden_ingredients):
             "message": explanation string
         }
     """
-    adapted_lower = adapted_text.lower()
+    if adapted_lower is None:
+        adapted_lower = adapted_text.lower()
     
-    found_forbidden = []
-    for ingredient in forbidden_ingredients:
-        if ingredient in adapted_lower:
-            found_forbidden.append(ingredient)
+    # One pass over the text for all forbidden ingredients
+    matcher = get_keyword_matcher(tuple(forbidden_ingredients))
+    found_forbidden = find_keywords(matcher, adapted_lower)
     
     if found_forbidden:
         return {
@@ -38,7 +40,8 @@ def check_constraint_violation(adapted_text, constraint, forbidden_ingredients):
         }
 
 
-def check_ingredient_consistency(adapted_text, source_ingredients, allowed_substitutions=None):
+def check_ingredient_consistency(adapted_text, source_ingredients, allowed_substitutions=None,
+                                 adapted_lower=None):
     """
     Check if adapted recipe uses reasonable ingredients (from source or valid substitutions).
     
@@ -46,6 +49,7 @@ def check_ingredient_consistency(adapted_text, source_ingredients, allowed_subst
         adapted_text: Generated recipe text (string)
         source_ingredients: Set of ingredient names from retrieved recipes (lowercase)
         allowed_substitutions: Dict mapping forbidden → allowed (e.g., {"chicken": ["chickpeas", "tofu"]})
+        adapted_lower: Optional precomputed adapted_text.lower()
     
     Returns:
         dict: {
@@ -57,7 +61,8 @@ def check_ingredient_consistency(adapted_text, source_ingredients, allowed_subst
     if allowed_substitutions is None:
         allowed_substitutions = {}
     
-    adapted_lower = adapted_text.lower()
+    if adapted_lower is None:
+        adapted_lower = adapted_text.lower()
     
     # Build valid ingredient set: source + all allowed substitutions
     valid_ingredients = set(source_ingredients)
@@ -124,10 +129,13 @@ def evaluate_hallucinations(adapted_text, constraint, source_recipes):
             ing["name"].lower() for ing in recipe["graph"]["ingredients"]
         )
     
-    # Run checks
-    constraint_result = check_constraint_violation(adapted_text, constraint, forbidden)
+    # Run checks (lowercase the text once for both)
+    adapted_lower = adapted_text.lower()
+    constraint_result = check_constraint_violation(
+        adapted_text, constraint, forbidden, adapted_lower
+    )
     consistency_result = check_ingredient_consistency(
-        adapted_text, source_ingredients, allowed_subs
+        adapted_text, source_ingredients, allowed_subs, adapted_lower
     )
     
     # Determine if hallucination occurred
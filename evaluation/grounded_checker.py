@@ -3,29 +3,93 @@ import re
 import spacy
 from ingredient_parser import parse_ingredient
 
+from utils.keyword_scan import build_keyword_matcher, find_first_keyword, find_keywords
+
 
 # === CONFIG ===
 USE_LEMMATIZATION = True  # Toggle: normalize "tomatoes" → "tomato"
+LEMMATIZER_MODE = "rule"  # "rule" (tagger-based, accurate) or "lookup" (table-based, faster; needs spacy-lookups-data)
+SINGLE_WORD_FAST_PATH = False  # Lemmatize one-word ingredients with suffix rules instead of spaCy (faster, approximate)
 
 # Meat keywords for constraint violation check (vegetarian constraint)
-MEAT_KEYWORDS = [
+MEAT_KEYWORDS = frozenset({
     "chicken", "beef", "pork", "lamb", "turkey", "bacon",
     "ham", "sausage", "meat", "steak", "veal", "duck",
     "prosciutto", "salami", "pepperoni", "chorizo"
-]
+})
+_MEAT_MATCHER = build_keyword_matcher(sorted(MEAT_KEYWORDS))  # Sorted: stable violation order
+
+# Garbage words to filter out of extracted ingredients (headers, artifacts, equipment)
+GARBAGE_WORDS = frozenset({
+    "ingredients", "ingredient", "steps", "step", "instructions", 
+    "instruction", "directions", "direction", "method", "note", "notes",
+    "tip", "tips", "serves", "serving", "servings", "yield", "prep",
+    "saucepan", "pan", "pot", "bowl", "skillet", "oven", "baking sheet",
+    "adapted", "recipe", "vegetarian", "vegan", "original"
+})
+
+# First words marking a line as an instruction rather than an ingredient
+_INSTRUCTION_STARTERS = frozenset({
+    "cook", "bake", "mix", "stir", "add", "combine", "heat", "place",
+    "pour", "serve", "let", "bring", "reduce", "simmer", "boil", "fry",
+    "saute", "chop", "dice", "slice", "preheat", "set", "cover", "remove",
+    "in", "the", "this", "you", "for", "with", "here", "note", "tip"
+})
+
+# Precompiled patterns for ingredient extraction
+_BULLET_RE = re.compile(r"^[\d.\-*•\[\]]+\s*")
+_SECTION_HEADER_RE = re.compile(r"[Ii]ngredients?:?\s*$")
+_SECTION_END_RE = re.compile(r"\s*(?:[Ss]teps?|[Ii]nstructions?|[Dd]irections?|[Mm]ethod)")
+
+# Irregular plurals for the single-word fast path (suffix rules get these wrong)
+_SINGLE_LEMMA = {
+    "leaves": "leaf", "loaves": "loaf", "halves": "half",
+    "cookies": "cookie", "brownies": "brownie", "smoothies": "smoothie",
+    "geese": "goose", "molasses": "molasses",
+}
 
 # Load spaCy model (lazy loading)
 _nlp = None
 
+# Memoized lemmatizations: ingredient strings repeat heavily across recipes
+LEMMA_CACHE_SIZE = 8192
+_lemma_cache = {}
+
 
 def _get_nlp():
-    """Lazy load spaCy model."""
+    """
+    Lazy load spaCy model.
+    
+    Only token.lemma_ is consumed, so the parser and NER are disabled.
+    The rule-based lemmatizer still needs tok2vec + tagger + attribute_ruler.
+    In "lookup" mode the neural pipeline is skipped entirely.
+    """
     global _nlp
     if _nlp is None:
-        _nlp = spacy.load("en_core_web_sm")
+        if LEMMATIZER_MODE == "lookup":
+            _nlp = spacy.blank("en")
+            _nlp.add_pipe("lemmatizer", config={"mode": "lookup"})
+            _nlp.initialize()
+        else:
+            _nlp = spacy.load("en_core_web_sm", disable=["parser", "ner", "textcat"])
     return _nlp
 
 
+def _lemmatize_single_word(word):
+    """Cheap plural stripping for a single lowercase word, no spaCy."""
+    if word in _SINGLE_LEMMA:
+        return _SINGLE_LEMMA[word]
+    if word.endswith(("ss", "us", "is")):
+        return word  # "hummus", "asparagus", "swiss"
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"  # "cherries" → "cherry"
+    if word.endswith(("oes", "ches", "shes", "xes")):
+        return word[:-2]  # "tomatoes" → "tomato", "peaches" → "peach"
+    if word.endswith("s") and len(word) > 3:
+        return word[:-1]  # "onions" → "onion"
+    return word
+
+
 def normalize_ingredient(ingredient, use_lemma=None):
     """
     Normalize ingredient string for matching.
@@ -37,17 +101,56 @@ def normalize_ingredient(ingredient, use_lemma=None):
     Returns:
         Normalized string (e.g., "dice tomato" if lemmatized, else "diced tomatoes")
     """
+    return normalize_ingredients_batch([ingredient], use_lemma)[0]
+
+
+def normalize_ingredients_batch(ingredients, use_lemma=None):
+    """
+    Normalize many ingredient strings in one spaCy pass.
+    
+    Uses nlp.pipe so pipeline overhead is paid once per batch
+    instead of once per ingredient. Previously seen strings are
+    served from a cache and never reach spaCy, and with
+    SINGLE_WORD_FAST_PATH single words skip it too.
+    
+    Args:
+        ingredients: Iterable of raw ingredient strings
+        use_lemma: Override global USE_LEMMATIZATION setting
+    
+    Returns:
+        List of normalized strings, in input order
+    """
     if use_lemma is None:
         use_lemma = USE_LEMMATIZATION
     
     # Basic normalization: lowercase, strip whitespace
-    normalized = ingredient.lower().strip()
+    normalized = [ing.lower().strip() for ing in ingredients]
     
-    if use_lemma:
-        nlp = _get_nlp()
-        doc = nlp(normalized)
-        # Lemmatize each token and rejoin
-        normalized = " ".join([token.lemma_ for token in doc])
+    if use_lemma and normalized:
+        unique = dict.fromkeys(normalized)
+        fast = {}
+        if SINGLE_WORD_FAST_PATH:
+            fast = {text: _lemmatize_single_word(text) for text in unique if text.isalpha()}
+        
+        # This batch's lemmas: fast path and cache hits first, then spaCy for
+        # the rest (kept locally, so a cache clear below cannot drop a hit)
+        lemmas = dict(fast)
+        misses = []
+        for text in unique:
+            if text in lemmas:
+                continue
+            if text in _lemma_cache:
+                lemmas[text] = _lemma_cache[text]
+            else:
+                misses.append(text)
+        if misses:
+            if len(_lemma_cache) + len(misses) > LEMMA_CACHE_SIZE:
+                _lemma_cache.clear()
+            nlp = _get_nlp()
+            # Lemmatize each token and rejoin
+            for text, doc in zip(misses, nlp.pipe(misses, batch_size=64)):
+                lemmas[text] = _lemma_cache[text] = " ".join(token.lemma_ for token in doc)
+        normalized = [lemmas[text] for text in normalized]
     
     return normalized
 
@@ -68,15 +171,6 @@ def extract_ingredients_from_text(text):
     ingredients = []
     seen = set()  # Track seen ingredients to avoid duplicates
     
-    # Garbage words to filter out (headers, artifacts, equipment)
-    GARBAGE_WORDS = {
-        "ingredients", "ingredient", "steps", "step", "instructions", 
-        "instruction", "directions", "direction", "method", "note", "notes",
-        "tip", "tips", "serves", "serving", "servings", "yield", "prep",
-        "saucepan", "pan", "pot", "bowl", "skillet", "oven", "baking sheet",
-        "adapted", "recipe", "vegetarian", "vegan", "original"
-    }
-    
     def add_ingredient(name):
         """Add ingredient if not already seen and not garbage."""
         name_lower = name.lower().strip()
@@ -102,7 +196,7 @@ def extract_ingredients_from_text(text):
             return
         
         # Remove bullet points, numbers, dashes at start
-        line = re.sub(r"^[\d\.\-\*\•\[\]]+\s*", "", line)
+        line = _BULLET_RE.sub("", line)
         if not line:
             return
         
@@ -111,14 +205,9 @@ def extract_ingredients_from_text(text):
             return
         
         # Skip lines that are clearly instructions (start with verbs)
-        instruction_starters = [
-            "cook", "bake", "mix", "stir", "add", "combine", "heat", "place",
-            "pour", "serve", "let", "bring", "reduce", "simmer", "boil", "fry",
-            "saute", "chop", "dice", "slice", "preheat", "set", "cover", "remove",
-            "in", "the", "this", "you", "for", "with", "here", "note", "tip"
-        ]
-        first_word = line.split()[0].lower() if line.split() else ""
-        if first_word in instruction_starters:
+        words = line.split()
+        first_word = words[0].lower() if words else ""
+        if first_word in _INSTRUCTION_STARTERS:
             return
         
         try:
@@ -130,25 +219,29 @@ def extract_ingredients_from_text(text):
         except Exception:
             pass
     
-    # Step 1: Strip markdown formatting (** for bold, etc.)
-    clean_text = re.sub(r"\*\*", "", text)
-    clean_text = re.sub(r"__", "", clean_text)
-    
-    # Step 2: Try to find and parse the Ingredients section
-    ingredients_section = re.search(
-        r"[Ii]ngredients?:?\s*\n(.*?)(?:\n\s*[Ss]teps?:?|\n\s*[Ii]nstructions?:?|\n\s*[Dd]irections?:?|\n\s*[Mm]ethod:?|$)",
-        clean_text,
-        re.DOTALL
-    )
-    
-    if ingredients_section:
-        # Parse only the ingredients section
-        section_text = ingredients_section.group(1)
-        for line in section_text.split("\n"):
+    # Single pass over the lines: strip markdown inline, parse only the
+    # Ingredients section if there is one (header line up to the
+    # steps/instructions header), otherwise every line
+    lines = text.split("\n")
+    last = len(lines) - 1
+    preamble = []  # Lines before any header, parsed only if none is found
+    in_section = False
+    
+    for i, raw_line in enumerate(lines):
+        # Literal str.replace needs no regex engine
+        line = raw_line.replace("**", "").replace("__", "")
+        if in_section:
+            if _SECTION_END_RE.match(line):
+                break
             parse_line(line)
-    else:
+        elif i < last and _SECTION_HEADER_RE.search(line):
+            in_section = True
+        else:
+            preamble.append(line)
+    
+    if not in_section:
         # No clear section found - parse all lines but be more conservative
-        for line in clean_text.split("\n"):
+        for line in preamble:
             parse_line(line)
     
     return ingredients
@@ -165,15 +258,18 @@ def normalize_ingredient_set(ingredients, use_lemma=None):
     Returns:
         Set of normalized ingredient strings
     """
-    return {normalize_ingredient(ing, use_lemma) for ing in ingredients}
+    return set(normalize_ingredients_batch(ingredients, use_lemma))
 
 
-def check_constraint_violations(text):
+def check_constraint_violations(text, text_lower=None, fast_check=False):
     """
     Check if generated recipe violates vegetarian constraint (contains meat).
     
     Args:
         text: Generated recipe text
+        text_lower: Optional precomputed text.lower(), avoids another copy
+        fast_check: Stop at the first meat keyword; "violations" then holds
+                    at most one keyword (use when only "violated" matters)
     
     Returns:
         dict: {
@@ -182,12 +278,15 @@ def check_constraint_violations(text):
             "count": number of violations
         }
     """
-    text_lower = text.lower()
+    if text_lower is None:
+        text_lower = text.lower()
     
-    found_meat = []
-    for keyword in MEAT_KEYWORDS:
-        if keyword in text_lower:
-            found_meat.append(keyword)
+    if fast_check:
+        first = find_first_keyword(_MEAT_MATCHER, text_lower)
+        found_meat = [first] if first else []
+    else:
+        # One pass over the text for all keywords
+        found_meat = find_keywords(_MEAT_MATCHER, text_lower)
     
     return {
         "violated": len(found_meat) > 0,
@@ -196,6 +295,33 @@ def check_constraint_violations(text):
     }
 
 
+def make_constraint_stopper():
+    """
+    Build an on_token callback that stops generation at the first meat keyword.
+    
+    For use with the streaming adapt functions, e.g.
+    baseline_adapt(..., on_token=make_constraint_stopper()).
+    Each completed line is scanned once, so the cost stays linear in the
+    output length. The returned (partial) text still needs evaluate_grounded.
+    
+    Returns:
+        Callable on_token(chunk, text_so_far) -> bool (True = stop)
+    """
+    scanned = 0  # Offset up to which text has been checked
+    
+    def on_token(chunk, text_so_far):
+        nonlocal scanned
+        if "\n" not in chunk:
+            return False
+        # Keywords never span lines, so only check newly completed lines
+        line_end = text_so_far.rindex("\n") + 1
+        new_lines = text_so_far[scanned:line_end].lower()
+        scanned = line_end
+        return find_first_keyword(_MEAT_MATCHER, new_lines) is not None
+    
+    return on_token
+
+
 def check_grounding_violations(extracted_ingredients, allowed_ingredients, use_lemma=None):
     """
     Check if extracted ingredients are grounded in allowed set.
@@ -220,7 +346,10 @@ def check_grounding_violations(extracted_ingredients, allowed_ingredients, use_l
         }
     """
     # Normalize all sets
-    extracted_norm = {normalize_ingredient(ing, use_lemma): ing for ing in extracted_ingredients}
+    extracted_norm = dict(zip(
+        normalize_ingredients_batch(extracted_ingredients, use_lemma),
+        extracted_ingredients
+    ))
     allowed_norm = normalize_ingredient_set(allowed_ingredients, use_lemma)
     
     # Find novel ingredients (not in allowed set)
@@ -237,7 +366,7 @@ def check_grounding_violations(extracted_ingredients, allowed_ingredients, use_l
     }
 
 
-def evaluate_grounded(text, allowed_ingredients, use_lemma=None):
+def evaluate_grounded(text, allowed_ingredients, use_lemma=None, fast_check=False):
     """
     Full evaluation of generated recipe for grounding and constraint violations.
     
@@ -245,6 +374,8 @@ def evaluate_grounded(text, allowed_ingredients, use_lemma=None):
         text: Generated recipe text
         allowed_ingredients: Set of allowed ingredients (from retrieved recipes)
         use_lemma: Override global USE_LEMMATIZATION setting
+        fast_check: Only detect whether the constraint is violated, without
+                    listing every meat keyword (see check_constraint_violations)
     
     Returns:
         dict: {
@@ -258,7 +389,7 @@ def evaluate_grounded(text, allowed_ingredients, use_lemma=None):
     extracted = extract_ingredients_from_text(text)
     
     # Check constraint violations (meat in vegetarian recipe)
-    constraint_result = check_constraint_violations(text)
+    constraint_result = check_constraint_violations(text, text.lower(), fast_check)
     
     # Check grounding violations (novel ingredients)
     grounding_result = check_grounding_violations(
@@ -0,0 +1,58 @@
+"""Running summary statistics for the grounded experiment runners."""
+
+METHODS = ("baseline", "grounded")
+
+
+class SummaryAccumulator:
+    """
+    Aggregate baseline vs grounded evaluations one example at a time.
+
+    Keeps only counters, so results can be streamed to disk instead of
+    being held in memory until the end of a run.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.constraint_violations = dict.fromkeys(METHODS, 0)
+        self.grounding_violations = dict.fromkeys(METHODS, 0)
+        self.novel_ingredients = dict.fromkeys(METHODS, 0)
+
+    def add(self, result):
+        """
+        Count one example.
+
+        Args:
+            result: Dict with result[method]["evaluation"] = evaluate_grounded()
+                    output, for method in "baseline" and "grounded"
+        """
+        self.n += 1
+        for method in METHODS:
+            evaluation = result[method]["evaluation"]
+            if evaluation["constraint_check"]["violated"]:
+                self.constraint_violations[method] += 1
+            if evaluation["grounding_check"]["violated"]:
+                self.grounding_violations[method] += 1
+            self.novel_ingredients[method] += evaluation["grounding_check"]["count"]
+
+    def finalize(self):
+        """
+        Compute aggregate statistics over all added examples.
+
+        Returns:
+            Summary dict ({"num_examples", "baseline": {...}, "grounded": {...}}),
+            or None if no examples were added
+        """
+        n = self.n
+        if n == 0:
+            return None
+
+        summary = {"num_examples": n}
+        for method in METHODS:
+            summary[method] = {
+                "constraint_violation_count": self.constraint_violations[method],
+                "constraint_violation_rate": self.constraint_violations[method] / n,
+                "grounding_violation_count": self.grounding_violations[method],
+                "grounding_violation_rate": self.grounding_violations[method] / n,
+                "avg_novel_ingredients": self.novel_ingredients[method] / n
+            }
+        return summary
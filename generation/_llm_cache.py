@@ -0,0 +1,67 @@
+"""On-disk cache of LLM responses, keyed on model + prompt.
+
+Off by default: sampling is not deterministic, so reusing a response is a
+choice (e.g. resuming a crashed run), not a transparent speedup.
+Turn it on with enable().
+"""
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / "results" / "llm_cache.sqlite"
+
+_conn = None
+_lock = threading.Lock()
+
+
+def enable(path=DEFAULT_CACHE_PATH):
+    """Open (or create) the cache database and start using it."""
+    global _conn
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        # Shared by the runners' worker threads; access is serialized by _lock
+        _conn = sqlite3.connect(path, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+        )
+        _conn.commit()
+
+
+def disable():
+    """Stop using the cache and close the database."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+
+
+def _key(model, prompt):
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def get(model, prompt):
+    """Return the cached response for (model, prompt), or None."""
+    if _conn is None:
+        return None
+    with _lock:
+        row = _conn.execute(
+            "SELECT text FROM responses WHERE key = ?", (_key(model, prompt),)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def put(model, prompt, text):
+    """Store a complete response for (model, prompt); no-op if the cache is off."""
+    if _conn is None:
+        return
+    with _lock:
+        _conn.execute(
+            "INSERT OR REPLACE INTO responses (key, text) VALUES (?, ?)",
+            (_key(model, prompt), text)
+        )
+        _conn.commit()
@@ -1,67 +1,84 @@
 """Text-RAG and Graph-RAG generation for recipe adaptation."""
-import ollama
+from generation.llm import stream_chat
+
+
+# Formatted contexts keyed by (format, recipe signature), reused when the same
+# similar recipes are formatted again
+CONTEXT_CACHE_SIZE = 128
+_context_cache = {}
+
+
+def _cached_context(kind, similar_recipes, build):
+    """Return build(similar_recipes), memoized per format and recipe signature."""
+    key = (kind, tuple(
+        (r["id"], r["name"], len(r.get("text", "")), len(r.get("graph", {}).get("edges", [])))
+        for r in similar_recipes
+    ))
+    context = _context_cache.get(key)
+    if context is None:
+        if len(_context_cache) >= CONTEXT_CACHE_SIZE:
+            _context_cache.clear()
+        context = _context_cache[key] = build(similar_recipes)
+    return context
 
 
 def format_text_rag_context(similar_recipes):
     """Format similar recipes as plain text for Text-RAG."""
-    context_parts = []
-    for recipe in similar_recipes:
-        context_parts.append(f"Recipe: {recipe['name']}")
-        context_parts.append(f"Text: {recipe['text']}")
-        context_parts.append("")  # blank line
-    return "\n".join(context_parts)
+    return _cached_context("text", similar_recipes, _build_text_rag_context)
+
+
+def _build_text_rag_context(similar_recipes):
+    """Build the Text-RAG context string (uncached)."""
+    # One block per recipe, blank line after each
+    return "\n".join(
+        f"Recipe: {recipe['name']}\nText: {recipe['text']}\n"
+        for recipe in similar_recipes
+    )
 
 
 def format_graph_rag_context(similar_recipes):
     """Format similar recipes as structured graph text for Graph-RAG."""
+    return _cached_context("graph", similar_recipes, _build_graph_rag_context)
+
+
+def _format_graph_edge(ing, edge):
+    """Format one edge as: ingredient (quantity unit state) [role]."""
+    details = " ".join(
+        str(value) for value in (edge.get("quantity"), edge.get("unit"), edge.get("state"))
+        if value
+    )
+    if details:
+        return f"{ing['name']} ({details}) [{edge['role']}]"
+    return f"{ing['name']} [{edge['role']}]"
+
+
+def _build_graph_rag_context(similar_recipes):
+    """Build the Graph-RAG context string (uncached)."""
     context_parts = []
     for recipe in similar_recipes:
-        context_parts.append(f"Recipe: {recipe['name']}")
-        context_parts.append("Structure:")
+        context_parts.append(f"Recipe: {recipe['name']}\nStructure:")
+        
+        # Index ingredients by id and edges by source action (one pass each)
+        ing_by_id = {i["id"]: i for i in recipe["graph"]["ingredients"]}
+        edges_by_src = {}
+        for e in recipe["graph"]["edges"]:
+            edges_by_src.setdefault(e["source"], []).append(e)
         
-        # Build action -> ingredient mapping
+        # Build action -> ingredient mapping, one line per step
         for action in recipe["graph"]["actions"]:
-            step_idx = action["step_index"]
-            verb = action["verb"]
-            
-            # Find edges from this action
-            action_edges = [
-                e for e in recipe["graph"]["edges"] 
-                if e["source"] == action["id"]
+            ingredients_info = [
+                _format_graph_edge(ing_by_id[edge["target"]], edge)
+                for edge in edges_by_src.get(action["id"], [])
+                if ing_by_id.get(edge["target"])
             ]
-            
-            # Find ingredient details for each edge
-            ingredients_info = []
-            for edge in action_edges:
-                # Find the ingredient
-                ing = next(
-                    (i for i in recipe["graph"]["ingredients"] if i["id"] == edge["target"]),
-                    None
-                )
-                if ing:
-                    # Format: ingredient (quantity unit state) [role]
-                    parts = [ing["name"]]
-                    details = []
-                    if edge.get("quantity"):
-                        details.append(str(edge["quantity"]))
-                    if edge.get("unit"):
-                        details.append(edge["unit"])
-                    if edge.get("state"):
-                        details.append(edge["state"])
-                    if details:
-                        parts.append(f"({' '.join(details)})")
-                    parts.append(f"[{edge['role']}]")
-                    ingredients_info.append(" ".join(parts))
-            
-            # Format step line
-            ing_str = ", ".join(ingredients_info) if ingredients_info else "—"
-            context_parts.append(f"  Step {step_idx}. {verb} → {ing_str}")
+            ing_str = ", ".join(ingredients_info) or "—"
+            context_parts.append(f"  Step {action['step_index']}. {action['verb']} → {ing_str}")
         
         context_parts.append("")  # blank line
     return "\n".join(context_parts)
 
 
-def generate_adaptation(context, constraint, model="llama3.2:3b"):
+def generate_adaptation(context, constraint, model="llama3.2:3b", on_token=None):
     """
     Generate adapted recipe using Ollama.
     
@@ -69,6 +86,8 @@ def generate_adaptation(context, constraint, model="llama3.2:3b"):
         context: Formatted context (text or graph)
         constraint: Adaptation constraint (e.g., "vegetarian")
         model: Ollama model name
+        on_token: Optional streaming callback on_token(chunk, text_so_far);
+                  returning True stops generation early
     
     Returns:
         Generated recipe text
@@ -84,46 +103,39 @@ Generate a step-by-step adapted recipe that satisfies the constraint. Output the
 
 Adapted recipe:"""
 
-    response = ollama.chat(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    
-    return response["message"]["content"]
+    return stream_chat(prompt, model, on_token)
 
 
-def text_rag_adapt(query_recipe, similar_recipes, constraint, model="llama3.2:3b"):
+def text_rag_adapt(query_recipe, similar_recipes, constraint, model="llama3.2:3b", on_token=None):
     """Adapt recipe using Text-RAG approach."""
     context = format_text_rag_context(similar_recipes)
-    return generate_adaptation(context, constraint, model)
+    return generate_adaptation(context, constraint, model, on_token)
 
 
-def graph_rag_adapt(query_recipe, similar_recipes, constraint, model="llama3.2:3b"):
+def graph_rag_adapt(query_recipe, similar_recipes, constraint, model="llama3.2:3b", on_token=None):
     """Adapt recipe using Graph-RAG approach."""
     context = format_graph_rag_context(similar_recipes)
-    return generate_adaptation(context, constraint, model)
+    return generate_adaptation(context, constraint, model, on_token)
 
 
 if __name__ == "__main__":
     from utils.recipe_utils import load_recipes
-    from retrieval.simple_retrieval import retrieve_similar
+    from retrieval.cc_retrieval import retrieve_similar
     
     print("=== Testing Generation System ===\n")
     
     # Load recipes and retrieve similar ones
     recipes = load_recipes()
+    recipes_by_id = {r["id"]: r for r in recipes}
     query_id = "recipe_001"  # Chicken Curry
     
     # Get query recipe
-    query_recipe = next(r for r in recipes if r["id"] == query_id)
+    query_recipe = recipes_by_id[query_id]
     print(f"Query: {query_recipe['name']} (meat)")
     
     # Retrieve similar recipes
-    similar_ids = retrieve_similar(query_id, recipes, top_k=2)
-    similar_recipes = [
-        next(r for r in recipes if r["id"] == recipe_id)
-        for recipe_id, _ in similar_ids
-    ]
+    similar_ids = retrieve_similar(query_id, recipes, top_k=2, index=recipes_by_id)
+    similar_recipes = [recipes_by_id[recipe_id] for recipe_id, _ in similar_ids]
     
     print(f"Retrieved: {', '.join(r['name'] for r in similar_recipes)}\n")
     
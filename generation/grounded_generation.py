@@ -1,5 +1,11 @@
 """Grounded generation for recipe adaptation: baseline vs constrained."""
-import ollama
+from generation.llm import stream_chat
+
+
+# Formatted retrieved contexts, reused when the same retrieved set is formatted
+# again (baseline_adapt and grounded_adapt see identical retrieved recipes)
+CONTEXT_CACHE_SIZE = 128
+_context_cache = {}
 
 
 def extract_allowed_ingredients(retrieved_recipes):
@@ -19,23 +25,44 @@ def extract_allowed_ingredients(retrieved_recipes):
     return allowed
 
 
+def _context_key(recipes):
+    """Cheap signature of a recipe list: id, name and field sizes per recipe."""
+    return tuple(
+        (r.get("id"), r["name"], len(r.get("ingredients", [])), len(r.get("steps", "")))
+        for r in recipes
+    )
+
+
 def format_retrieved_context(retrieved_recipes):
     """
     Format retrieved recipes as readable context for prompt.
     
+    Results are memoized per retrieved-recipe signature.
+    
     Args:
         retrieved_recipes: List of recipe dicts with name, ingredients, steps
     
     Returns:
         Multi-line string with recipe details
     """
-    parts = []
-    for i, recipe in enumerate(retrieved_recipes, 1):
-        parts.append(f"Recipe {i}: {recipe['name']}")
-        parts.append(f"Ingredients: {', '.join(recipe['ingredients'])}")
-        parts.append(f"Steps: {recipe['steps']}")
-        parts.append("")
-    return "\n".join(parts)
+    key = _context_key(retrieved_recipes)
+    context = _context_cache.get(key)
+    if context is None:
+        if len(_context_cache) >= CONTEXT_CACHE_SIZE:
+            _context_cache.clear()
+        context = _context_cache[key] = _build_retrieved_context(retrieved_recipes)
+    return context
+
+
+def _build_retrieved_context(retrieved_recipes):
+    """Build the retrieved-recipes context string (uncached)."""
+    # One block per recipe, blank line after each
+    return "\n".join(
+        f"Recipe {i}: {recipe['name']}\n"
+        f"Ingredients: {', '.join(recipe['ingredients'])}\n"
+        f"Steps: {recipe['steps']}\n"
+        for i, recipe in enumerate(retrieved_recipes, 1)
+    )
 
 
 def format_query_recipe(query_recipe):
@@ -47,7 +74,7 @@ def format_query_recipe(query_recipe):
     )
 
 
-def baseline_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:3b"):
+def baseline_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:3b", on_token=None):
     """
     Unconstrained adaptation — LLM sees retrieved recipes but no ingredient restriction.
     
@@ -56,6 +83,8 @@ def baseline_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:
         retrieved_recipes: List of similar recipe dicts for context
         constraint: Adaptation constraint (e.g., "vegetarian")
         model: Ollama model name
+        on_token: Optional streaming callback on_token(chunk, text_so_far);
+                  returning True stops generation early
     
     Returns:
         Generated adapted recipe text
@@ -79,15 +108,10 @@ Generate the adapted recipe with:
 
 Adapted recipe:"""
 
-    response = ollama.chat(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    
-    return response["message"]["content"]
+    return stream_chat(prompt, model, on_token)
 
 
-def grounded_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:3b"):
+def grounded_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:3b", on_token=None):
     """
     Constrained adaptation — explicit ingredient whitelist in prompt.
     
@@ -96,6 +120,8 @@ def grounded_adapt(query_recipe, retrieved_recipes, constraint, model="llama3.2:
         retrieved_recipes: List of similar recipe dicts for context
         constraint: Adaptation constraint (e.g., "vegetarian")
         model: Ollama model name
+        on_token: Optional streaming callback on_token(chunk, text_so_far);
+                  returning True stops generation early
     
     Returns:
         Generated adapted recipe text
@@ -129,9 +155,4 @@ Generate the adapted recipe with:
 
 Adapted recipe:"""
 
-    response = ollama.chat(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    
-    return response["message"]["content"]
+    return stream_chat(prompt, model, on_token)
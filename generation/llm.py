@@ -0,0 +1,52 @@
+"""Shared Ollama chat call for the generation modules."""
+import ollama
+
+from generation import _llm_cache
+
+
+def stream_chat(prompt, model, on_token=None):
+    """
+    Send a single-turn chat to Ollama and return the generated text.
+
+    The response is streamed, so callers can inspect output while it is
+    being generated. Returning True from on_token stops generation early
+    and the partial text is returned.
+
+    If the on-disk response cache is enabled (generation._llm_cache),
+    complete responses are looked up and stored by (model, prompt). Calls
+    with on_token bypass it, since they need the live stream.
+
+    Args:
+        prompt: User prompt string
+        model: Ollama model name
+        on_token: Optional callback on_token(chunk, text_so_far) -> bool,
+                  called for every streamed chunk
+
+    Returns:
+        Generated text (partial if stopped by on_token)
+    """
+    if on_token is None:
+        cached = _llm_cache.get(model, prompt)
+        if cached is not None:
+            return cached
+
+    stream = ollama.chat(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True
+    )
+
+    text = ""
+    try:
+        for chunk in stream:
+            piece = chunk["message"]["content"]
+            text += piece
+            if on_token is not None and on_token(piece, text):
+                break
+    finally:
+        # Closes the HTTP stream, so Ollama stops generating on early exit
+        stream.close()
+
+    if on_token is None:
+        _llm_cache.put(model, prompt, text)
+    return text
@@ -1,9 +1,58 @@
 """CC Experiment: Retrieval by recipe ID for toy dataset."""
+import numpy as np
+
 from utils.recipe_utils import get_ingredients
-from retrieval.jaccard import jaccard_similarity
 
 
-def retrieve_similar(query_recipe_id, recipes, top_k=2):
+def build_recipe_index(recipes):
+    """Map recipe ID -> recipe dict for constant-time lookups."""
+    return {r["id"]: r for r in recipes}
+
+
+def precompute_ingredient_sets(recipes):
+    """Map recipe ID -> frozenset of ingredient names, computed once per recipe."""
+    return {r["id"]: frozenset(get_ingredients(r)) for r in recipes}
+
+
+def build_ingredient_matrix(recipes, ingredient_index=None):
+    """
+    Encode recipe ingredients as rows of a 0/1 matrix over a shared vocabulary.
+    
+    Args:
+        recipes: List of all recipes (row order follows this list)
+        ingredient_index: Optional prebuilt ID -> ingredient set dict
+    
+    Returns:
+        dict: {
+            "ids": recipe IDs in row order,
+            "rows": recipe ID -> row number,
+            "matrix": float32 array (N recipes x V ingredients),
+            "sizes": number of ingredients per row
+        }
+    """
+    if ingredient_index is None:
+        ingredient_index = precompute_ingredient_sets(recipes)
+    
+    ids = [r["id"] for r in recipes]
+    vocab = {}
+    for recipe_id in ids:
+        for ing in ingredient_index[recipe_id]:
+            vocab.setdefault(ing, len(vocab))
+    
+    matrix = np.zeros((len(ids), len(vocab)), dtype=np.float32)
+    for row, recipe_id in enumerate(ids):
+        matrix[row, [vocab[ing] for ing in ingredient_index[recipe_id]]] = 1.0
+    
+    return {
+        "ids": ids,
+        "rows": {recipe_id: row for row, recipe_id in enumerate(ids)},
+        "matrix": matrix,
+        "sizes": matrix.sum(axis=1, dtype=np.float64)
+    }
+
+
+def retrieve_similar(query_recipe_id, recipes, top_k=2, index=None, ingredient_index=None,
+                     ingredient_matrix=None):
     """
     Find the top-k most similar recipes based on ingredient overlap.
     
@@ -11,63 +60,91 @@ def retrieve_similar(query_recipe_id, recipes, top_k=2):
         query_recipe_id: ID of the query recipe
         recipes: List of all recipes
         top_k: Number of similar recipes to return
+        index: Optional prebuilt ID -> recipe dict (from build_recipe_index),
+               lets repeated callers skip the linear scan for the query recipe
+        ingredient_index: Optional prebuilt ID -> ingredient set dict
+                          (from precompute_ingredient_sets), skips re-parsing
+                          every recipe's ingredients on each call
+        ingredient_matrix: Optional prebuilt matrix (from build_ingredient_matrix),
+                           skips re-encoding the corpus on each call
     
     Returns:
         List of (recipe_id, score) tuples, sorted by score descending
     """
     # Find query recipe
-    query_recipe = None
-    for r in recipes:
-        if r["id"] == query_recipe_id:
-            query_recipe = r
-            break
+    if index is not None:
+        query_recipe = index.get(query_recipe_id)
+    else:
+        query_recipe = next((r for r in recipes if r["id"] == query_recipe_id), None)
     
     if not query_recipe:
         raise ValueError(f"Recipe {query_recipe_id} not found")
     
-    # Get query ingredients
-    query_ingredients = get_ingredients(query_recipe)
-    
-    # Calculate similarity with all other recipes
-    scores = []
-    for recipe in recipes:
-        if recipe["id"] == query_recipe_id:
-            continue  # Skip self
-        
-        recipe_ingredients = get_ingredients(recipe)
-        
-        # Use shared Jaccard function
-        score = jaccard_similarity(query_ingredients, recipe_ingredients)
-        
-        scores.append((recipe["id"], score))
-    
-    # Sort by score descending and return top-k
-    scores.sort(key=lambda x: x[1], reverse=True)
-    return scores[:top_k]
+    if ingredient_matrix is None:
+        ingredient_matrix = build_ingredient_matrix(recipes, ingredient_index)
+    
+    matrix = ingredient_matrix["matrix"]
+    sizes = ingredient_matrix["sizes"]
+    query_row = ingredient_matrix["rows"][query_recipe_id]
+    
+    # Jaccard against every recipe at once: |A∩B| / (|A| + |B| - |A∩B|)
+    inter = (matrix @ matrix[query_row]).astype(np.float64)
+    union = sizes + sizes[query_row] - inter
+    scores = inter / np.maximum(union, 1.0)
+    scores[query_row] = -np.inf  # Skip self
+    
+    k = min(top_k, len(scores) - 1)
+    if k <= 0:
+        return []
+    
+    # Select top-k without a full sort; keep ties in corpus order like a stable sort
+    kth_score = np.partition(scores, -k)[-k]
+    candidates = np.flatnonzero(scores >= kth_score)
+    top = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+    
+    ids = ingredient_matrix["ids"]
+    return [(ids[i], float(scores[i])) for i in top]
+
+
+def retrieve_similar_batch(query_recipe_ids, recipes, top_k=2):
+    """
+    Run retrieve_similar for many queries, building the indexes once.
+    
+    Args:
+        query_recipe_ids: List of query recipe IDs
+        recipes: List of all recipes
+        top_k: Number of similar recipes to return per query
+    
+    Returns:
+        Dict mapping query ID -> list of (recipe_id, score) tuples
+    """
+    index = build_recipe_index(recipes)
+    ingredient_matrix = build_ingredient_matrix(recipes)
+    return {
+        query_id: retrieve_similar(
+            query_id, recipes, top_k,
+            index=index, ingredient_matrix=ingredient_matrix
+        )
+        for query_id in query_recipe_ids
+    }
 
 
 if __name__ == "__main__":
     # Test the retrieval system
+    from utils.recipe_utils import load_recipes
+    
     recipes = load_recipes()
+    recipes_by_id = build_recipe_index(recipes)
     
     print("=== Testing Retrieval System ===\n")
     
     # Test with Chicken Curry (should find similar recipes)
     query_id = "recipe_001"
     print(f"Query recipe: {query_id}")
+    print(f"Name: {recipes_by_id[query_id]['name']}\n")
     
-    # Find query recipe name
-    for r in recipes:
-        if r["id"] == query_id:
-            print(f"Name: {r['name']}\n")
-            break
-    
-    results = retrieve_similar(query_id, recipes, top_k=2)
+    results = retrieve_similar(query_id, recipes, top_k=2, index=recipes_by_id)
     
     print("Top 2 similar recipes:")
     for recipe_id, score in results:
-        # Find recipe name
-        for r in recipes:
-            if r["id"] == recipe_id:
-                print(f"  {recipe_id} ({r['name']}): {score:.3f}")
-                break
+        print(f"  {recipe_id} ({recipes_by_id[recipe_id]['name']}): {score:.3f}")
@@ -1,66 +1,306 @@
 """Grounded Experiment: Retrieval by recipe object for RecipePairs dataset."""
+import heapq
+
+import numpy as np
+
 from utils.recipe_utils import get_ingredients
-from retrieval.jaccard import combined_similarity
+from retrieval.jaccard import jaccard_similarity, tokenize_name
+from retrieval.jaccard_bits import pack_sets, jaccard_scan
 
 
 # Weight for ingredient similarity (0.4 ingredient + 0.6 name)
 ALPHA = 0.4
+BETA = 1 - ALPHA  # Weight for name similarity
+
+# "sparse": score the whole corpus at once with numpy over inverted postings
+# "bitset": score the whole corpus with popcounts over packed uint64 bitsets
+# "python": per-recipe set Jaccard loop (reference implementation)
+# All return identical results, including tie order.
+RETRIEVAL_BACKEND = "sparse"
+
+
+def _build_postings(token_sets):
+    """
+    Build an inverted index over a list of token sets.
+    
+    Returns:
+        (postings, sizes): token -> int32 array of row numbers containing it,
+        and float64 array of set sizes per row
+    """
+    rows_by_token = {}
+    for row, tokens in enumerate(token_sets):
+        for token in tokens:
+            rows_by_token.setdefault(token, []).append(row)
+    
+    postings = {token: np.array(rows, dtype=np.int32) for token, rows in rows_by_token.items()}
+    sizes = np.array([len(tokens) for tokens in token_sets], dtype=np.float64)
+    return postings, sizes
+
+
+def build_sparse_index(ingredient_sets, name_tokens):
+    """
+    Precompute the sparse (inverted postings) form of a corpus for vectorized retrieval.
+    
+    Intersection sizes against the whole corpus are a bincount over the
+    postings of the query's tokens, i.e. a sparse binary matrix-vector product.
+    
+    Args:
+        ingredient_sets: Ingredient set per corpus recipe
+        name_tokens: Name token set per corpus recipe
+    
+    Returns:
+        dict: {
+            "ingredient_postings", "ingredient_sizes",
+            "name_postings", "name_sizes"
+        }
+    """
+    ingredient_postings, ingredient_sizes = _build_postings(ingredient_sets)
+    name_postings, name_sizes = _build_postings(name_tokens)
+    
+    return {
+        "ingredient_postings": ingredient_postings,
+        "ingredient_sizes": ingredient_sizes,
+        "name_postings": name_postings,
+        "name_sizes": name_sizes
+    }
+
+
+def build_bitset_index(ingredient_sets, name_tokens):
+    """
+    Precompute packed bitsets of a corpus for popcount-based retrieval.
+    
+    Args:
+        ingredient_sets: Ingredient set per corpus recipe
+        name_tokens: Name token set per corpus recipe
+    
+    Returns:
+        dict: {"ingredients": pack_sets() output, "names": pack_sets() output}
+    """
+    return {
+        "ingredients": pack_sets(ingredient_sets),
+        "names": pack_sets(name_tokens)
+    }
+
+
+def _rows_by_name(names):
+    """Map recipe name -> int32 array of corpus rows with that name."""
+    rows_by_name = {}
+    for row, name in enumerate(names):
+        rows_by_name.setdefault(name, []).append(row)
+    return {name: np.array(rows, dtype=np.int32) for name, rows in rows_by_name.items()}
+
+
+def _intern_sets(token_sets, vocab):
+    """
+    Map each token set to a frozenset of small int ids, growing vocab as needed.
+    
+    Int sets hash and compare faster than string sets in the python backend.
+    """
+    return [frozenset(vocab.setdefault(token, len(vocab)) for token in tokens)
+            for tokens in token_sets]
+
 
+def _intern_query(tokens, vocab):
+    """
+    Map query tokens to ids without growing vocab.
+    
+    Unknown tokens get distinct negative ids: they never intersect the
+    corpus but still count towards the query set's size.
+    """
+    return frozenset(vocab.get(token, -1 - j) for j, token in enumerate(tokens))
+
+
+def build_corpus_index(corpus):
+    """
+    Precompute per-recipe retrieval features once for a corpus.
+    
+    Build this once per run and pass it to retrieve_similar_recipes,
+    instead of re-tokenizing every corpus recipe on every query.
+    
+    Args:
+        corpus: List of recipe dicts to search
+    
+    Returns:
+        dict: {
+            "recipes": the corpus list,
+            "ingredient_sets": frozenset of ingredient names per recipe,
+            "name_tokens": frozenset of lowercase name words per recipe,
+            "names": raw recipe names (for skipping the query itself),
+            "sparse": build_sparse_index() output, or None,
+            "bitset": build_bitset_index() output, or None,
+            "rows_by_name": name -> corpus rows, or None for the python backend,
+            "row_of": id(recipe) -> corpus row (recipes are kept alive by "recipes"),
+            "vocab": token -> int id, "ingredient_ids"/"name_token_ids": interned
+                     sets (python backend only, otherwise None)
+        }
+    """
+    ingredient_sets = [frozenset(get_ingredients(r)) for r in corpus]
+    name_tokens = [tokenize_name(r.get("name", "")) for r in corpus]
+    names = [r.get("name") for r in corpus]
+    
+    sparse = bitset = rows_by_name = None
+    if RETRIEVAL_BACKEND == "sparse":
+        sparse = build_sparse_index(ingredient_sets, name_tokens)
+    elif RETRIEVAL_BACKEND == "bitset":
+        bitset = build_bitset_index(ingredient_sets, name_tokens)
+    if sparse is not None or bitset is not None:
+        rows_by_name = _rows_by_name(names)
+    
+    vocab = ingredient_ids = name_token_ids = None
+    if RETRIEVAL_BACKEND == "python":
+        vocab = {}
+        ingredient_ids = _intern_sets(ingredient_sets, vocab)
+        name_token_ids = _intern_sets(name_tokens, vocab)
+    
+    return {
+        "recipes": corpus,
+        "ingredient_sets": ingredient_sets,
+        "name_tokens": name_tokens,
+        "names": names,
+        "sparse": sparse,
+        "bitset": bitset,
+        "rows_by_name": rows_by_name,
+        "row_of": {id(recipe): row for row, recipe in enumerate(corpus)},
+        "vocab": vocab,
+        "ingredient_ids": ingredient_ids,
+        "name_token_ids": name_token_ids
+    }
+
+
+def _intersection_sizes(postings, query_tokens, n_rows):
+    """Count shared tokens between query_tokens and every corpus row."""
+    hits = [postings[token] for token in query_tokens if token in postings]
+    if not hits:
+        return np.zeros(n_rows, dtype=np.float64)
+    return np.bincount(np.concatenate(hits), minlength=n_rows).astype(np.float64)
 
-def retrieve_similar_recipes(query_recipe, corpus, top_k=3):
+
+def _jaccard_all(postings, sizes, query_tokens):
+    """Jaccard of query_tokens against every corpus row: |A∩B| / (|A| + |B| - |A∩B|)."""
+    inter = _intersection_sizes(postings, query_tokens, len(sizes))
+    union = sizes + len(query_tokens) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _retrieve_vectorized(query_ingredients, query_tokens, query_name, corpus_index, top_k):
+    """Vectorized retrieve_similar_recipes() over the sparse or bitset index."""
+    recipes = corpus_index["recipes"]
+    
+    sparse = corpus_index["sparse"]
+    if sparse is not None:
+        ingr_sim = _jaccard_all(sparse["ingredient_postings"], sparse["ingredient_sizes"],
+                                query_ingredients)
+        name_sim = _jaccard_all(sparse["name_postings"], sparse["name_sizes"], query_tokens)
+    else:
+        bitset = corpus_index["bitset"]
+        ingr_sim = jaccard_scan(bitset["ingredients"], query_ingredients)
+        name_sim = jaccard_scan(bitset["names"], query_tokens)
+    scores = ALPHA * ingr_sim + BETA * name_sim
+    
+    # Skip if same recipe (by name, since RecipePairs doesn't have consistent IDs);
+    # most queries are not in the corpus and need no masking
+    n_candidates = len(scores)
+    skipped = corpus_index["rows_by_name"].get(query_name)
+    if skipped is not None:
+        scores[skipped] = -np.inf
+        n_candidates -= len(skipped)
+    
+    k = min(top_k, n_candidates)
+    if k <= 0:
+        return []
+    
+    # Select top-k without a full sort; keep ties in corpus order like a stable sort
+    kth_score = np.partition(scores, -k)[-k]
+    candidates = np.flatnonzero(scores >= kth_score)
+    top = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+    
+    return [(recipes[i], float(scores[i])) for i in top]
+
+
+def retrieve_similar_recipes(query_recipe, corpus_index, top_k=3):
     """
     Find top-k most similar recipes from corpus based on combined similarity.
     
-    Uses: alpha * ingredient_jaccard + (1 - alpha) * name_jaccard
+    Uses: ALPHA * ingredient_jaccard + BETA * name_jaccard (BETA = 1 - ALPHA)
     Default: 0.4 * ingredients + 0.6 * names
     
     Works with recipe objects directly (not IDs), suitable for RecipePairs format.
     
     Args:
         query_recipe: Recipe dict (must have 'ingredients' and 'name' fields)
-        corpus: List of recipe dicts to search
+        corpus_index: Index from build_corpus_index()
         top_k: Number of similar recipes to return
     
     Returns:
         List of (recipe, score) tuples, sorted by score descending
     """
     query_ingredients = get_ingredients(query_recipe)
+    query_tokens = tokenize_name(query_recipe.get("name", ""))
+    query_name = query_recipe.get("name")
+    
+    if corpus_index.get("rows_by_name") is not None:
+        return _retrieve_vectorized(query_ingredients, query_tokens, query_name,
+                                    corpus_index, top_k)
+    
+    recipes = corpus_index["recipes"]
+    ingredient_sets = corpus_index["ingredient_ids"]
+    name_tokens = corpus_index["name_token_ids"]
+    names = corpus_index["names"]
+    vocab = corpus_index["vocab"]
+    query_ingredients = _intern_query(query_ingredients, vocab)
+    query_tokens = _intern_query(query_tokens, vocab)
+    
+    if top_k <= 0:
+        return []
     
-    scores = []
-    for recipe in corpus:
+    # Best k so far as a min-heap of (score, -row): on equal scores the earlier
+    # corpus row wins, the same tie order as a stable sort
+    top = []
+    for i in range(len(recipes)):
         # Skip if same recipe (by name, since RecipePairs doesn't have consistent IDs)
-        if recipe.get("name") == query_recipe.get("name"):
+        if names[i] == query_name:
             continue
         
-        recipe_ingredients = get_ingredients(recipe)
-        score = combined_similarity(
-            query_recipe, recipe, 
-            query_ingredients, recipe_ingredients,
-            alpha=ALPHA
-        )
+        name_sim = jaccard_similarity(query_tokens, name_tokens[i])
         
-        scores.append((recipe, score))
+        # Even a perfect ingredient match scores at most ALPHA + BETA * name_sim;
+        # if that can't beat the current k-th best, skip the ingredient Jaccard
+        if len(top) == top_k and ALPHA + BETA * name_sim <= top[0][0]:
+            continue
+        
+        ingr_sim = jaccard_similarity(query_ingredients, ingredient_sets[i])
+        score = ALPHA * ingr_sim + BETA * name_sim
+        
+        if len(top) < top_k:
+            heapq.heappush(top, (score, -i))
+        elif score > top[0][0]:
+            heapq.heapreplace(top, (score, -i))
     
-    # Sort by score descending and return top-k
-    scores.sort(key=lambda x: x[1], reverse=True)
-    return scores[:top_k]
+    top.sort(reverse=True)
+    return [(recipes[-neg_row], score) for score, neg_row in top]
 
 
-def extract_allowed_ingredients(retrieved_recipes):
+def extract_allowed_ingredients(retrieved_recipes, corpus_index=None):
     """
     Extract union of all ingredients from retrieved recipes.
     
     Args:
         retrieved_recipes: List of (recipe, score) tuples from retrieval
+        corpus_index: Optional index the recipes were retrieved from; reuses
+                      its precomputed ingredient sets instead of re-parsing
     
     Returns:
         Set of ingredient names (lowercase)
     """
-    allowed = set()
-    for recipe, _score in retrieved_recipes:
-        ingredients = get_ingredients(recipe)
-        allowed.update(ingredients)
-    return allowed
+    if corpus_index is None:
+        return set().union(*(get_ingredients(recipe) for recipe, _score in retrieved_recipes))
+    
+    row_of = corpus_index["row_of"]
+    ingredient_sets = corpus_index["ingredient_sets"]
+    return set().union(*(
+        ingredient_sets[row_of[id(recipe)]] if id(recipe) in row_of else get_ingredients(recipe)
+        for recipe, _score in retrieved_recipes
+    ))
 
 
 if __name__ == "__main__":
@@ -75,6 +315,7 @@ if __name__ == "__main__":
     
     # Build corpus from all targets
     corpus = [pair["target"] for pair in pairs]
+    corpus_index = build_corpus_index(corpus)
     print(f"Corpus size: {len(corpus)} vegetarian recipes\n")
     
     # Test with first base recipe
@@ -83,13 +324,13 @@ if __name__ == "__main__":
     print(f"Query ingredients: {query['ingredients'][:5]}...\n")
     
     # Retrieve
-    results = retrieve_similar_recipes(query, corpus, top_k=3)
+    results = retrieve_similar_recipes(query, corpus_index, top_k=3)
     
     print("Top 3 similar recipes:")
     for recipe, score in results:
         print(f"  {recipe['name'][:40]:40} | score: {score:.3f}")
     
     # Extract allowed ingredients
-    allowed = extract_allowed_ingredients(results)
+    allowed = extract_allowed_ingredients(results, corpus_index)
     print(f"\nAllowed ingredients ({len(allowed)} total):")
     print(f"  {list(allowed)[:10]}...")
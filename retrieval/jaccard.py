@@ -1,11 +1,13 @@
 """Shared Jaccard similarity computation for retrieval."""
+from functools import lru_cache
 
 
 def jaccard_similarity(set1, set2):
     """
     Compute Jaccard similarity between two sets.
     
-    Jaccard = |intersection| / |union|
+    Jaccard = |intersection| / |union|, with |union| = |A| + |B| - |intersection|,
+    so only the intersection set is built.
     
     Args:
         set1: First set of items
@@ -14,13 +16,18 @@ def jaccard_similarity(set1, set2):
     Returns:
         float: Similarity score between 0.0 and 1.0
     """
-    if not set1 and not set2:
-        return 0.0
+    # set & set already iterates the smaller operand in CPython; swapping
+    # here by hand only adds overhead
+    intersection = len(set1 & set2)
+    union = len(set1) + len(set2) - intersection
     
-    intersection = set1 & set2
-    union = set1 | set2
-    
-    return len(intersection) / len(union) if union else 0.0
+    return intersection / union if union else 0.0
+
+
+@lru_cache(maxsize=200_000)
+def tokenize_name(name):
+    """Lowercase word tokens of a recipe name, cached per raw name string."""
+    return frozenset(name.lower().split())
 
 
 def name_jaccard(name1, name2):
@@ -34,9 +41,7 @@ def name_jaccard(name1, name2):
     Returns:
         float: Similarity score between 0.0 and 1.0
     """
-    words1 = set(name1.lower().split())
-    words2 = set(name2.lower().split())
-    return jaccard_similarity(words1, words2)
+    return jaccard_similarity(tokenize_name(name1), tokenize_name(name2))
 
 
 def combined_similarity(recipe1, recipe2, ingredients1, ingredients2, alpha=0.4):
@@ -45,6 +50,9 @@ def combined_similarity(recipe1, recipe2, ingredients1, ingredients2, alpha=0.4)
     
     combined = alpha * ingredient_jaccard + (1 - alpha) * name_jaccard
     
+    Retrieval inlines this over precomputed token sets
+    (see retrieval.grounded_retrieval); this is the standalone form.
+    
     Args:
         recipe1: First recipe dict (must have 'name')
         recipe2: Second recipe dict (must have 'name')
@@ -0,0 +1,85 @@
+"""Jaccard over packed uint64 bitsets (one bit per vocabulary token)."""
+import numpy as np
+
+# np.bitwise_count is NumPy >= 2.0; older versions count bits per byte from a table
+_HAS_BITWISE_COUNT = hasattr(np, "bitwise_count")
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _pack_rows(dense):
+    """Pack a boolean (rows x V) array into uint64 words, 64 tokens per word."""
+    n_rows, n_tokens = dense.shape
+    n_words = max(1, -(-n_tokens // 64))
+    padded = np.zeros((n_rows, n_words * 64), dtype=bool)
+    padded[:, :n_tokens] = dense
+    return np.packbits(padded, axis=1, bitorder="little").view(np.uint64)
+
+
+def _popcount_rows(words):
+    """Number of set bits per row of a uint64 (rows x W) array."""
+    if _HAS_BITWISE_COUNT:
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _BYTE_POPCOUNT[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def pack_sets(token_sets):
+    """
+    Encode a list of token sets as a packed bit matrix.
+
+    Args:
+        token_sets: List of sets of hashable tokens
+
+    Returns:
+        dict: {
+            "vocab": token -> bit position,
+            "bits": uint64 array (N x W words),
+            "cards": float64 array of set sizes per row
+        }
+    """
+    vocab = {}
+    for tokens in token_sets:
+        for token in tokens:
+            vocab.setdefault(token, len(vocab))
+
+    dense = np.zeros((len(token_sets), len(vocab)), dtype=bool)
+    for row, tokens in enumerate(token_sets):
+        dense[row, [vocab[token] for token in tokens]] = True
+
+    return {
+        "vocab": vocab,
+        "bits": _pack_rows(dense),
+        "cards": np.array([len(tokens) for tokens in token_sets], dtype=np.float64)
+    }
+
+
+def pack_query(tokens, packed):
+    """
+    Encode a query token set in the bit layout of pack_sets() output.
+
+    Tokens outside the corpus vocabulary get no bit (they can never
+    intersect) but still count towards the query size.
+    """
+    vocab = packed["vocab"]
+    dense = np.zeros((1, len(vocab)), dtype=bool)
+    dense[0, [vocab[token] for token in tokens if token in vocab]] = True
+    return _pack_rows(dense)[0]
+
+
+def jaccard_scan(packed, query_tokens):
+    """
+    Jaccard of query_tokens against every packed corpus row.
+
+    |A∩B| is a popcount of the AND of the packed words;
+    |A∪B| = |A| + |B| - |A∩B| from the precomputed row sizes.
+
+    Args:
+        packed: Output of pack_sets()
+        query_tokens: Set of query tokens
+
+    Returns:
+        float64 array of similarities, one per corpus row
+    """
+    query_bits = pack_query(query_tokens, packed)
+    inter = _popcount_rows(packed["bits"] & query_bits).astype(np.float64)
+    union = packed["cards"] + len(query_tokens) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
@@ -1,15 +1,16 @@
 """Experiment CC: Text-RAG vs Graph-RAG comparison (CookingCAKE-inspired bipartite graphs)."""
-import json
 from datetime import datetime
 from pathlib import Path
 
 from utils.recipe_utils import load_recipes
-from retrieval.cc_retrieval import retrieve_similar
+from utils.json_io import dumps
+from retrieval.cc_retrieval import build_recipe_index, build_ingredient_matrix, retrieve_similar
 from generation.cc_rag_generation import text_rag_adapt, graph_rag_adapt
 from evaluation.cc_hallucination_checker import evaluate_hallucinations
 
 
-def run_experiment(query_recipe_id, constraint="vegetarian", model="llama3.2:3b"):
+def run_experiment(query_recipe_id, constraint="vegetarian", model="llama3.2:3b",
+                   recipes=None, recipes_by_id=None, ingredient_matrix=None):
     """
     Run full experiment: retrieve → generate (both RAG types) → evaluate.
     
@@ -17,6 +18,12 @@ def run_experiment(query_recipe_id, constraint="vegetarian", model="llama3.2:3b"
         query_recipe_id: ID of recipe to adapt
         constraint: Adaptation constraint (e.g., "vegetarian")
         model: LLM model name
+        recipes: Optional preloaded recipes (loaded from disk if omitted)
+        recipes_by_id: Optional ID -> recipe dict (from build_recipe_index)
+        ingredient_matrix: Optional prebuilt matrix (from build_ingredient_matrix)
+    
+    Pass the last three when running several experiments, so the recipes
+    are loaded and indexed once instead of per query.
     
     Returns:
         dict: Experiment results with adaptations and evaluations
@@ -26,17 +33,18 @@ def run_experiment(query_recipe_id, constraint="vegetarian", model="llama3.2:3b"
     print(f"{'='*60}\n")
     
     # Step 1: Load recipes
-    recipes = load_recipes()
-    query_recipe = next(r for r in recipes if r["id"] == query_recipe_id)
+    if recipes is None:
+        recipes = load_recipes()
+    if recipes_by_id is None:
+        recipes_by_id = build_recipe_index(recipes)
+    query_recipe = recipes_by_id[query_recipe_id]
     print(f"Query: {query_recipe['name']}")
     
     # Step 2: Retrieve similar recipes
     print("\n[1/4] Retrieving similar recipes...")
-    similar_ids = retrieve_similar(query_recipe_id, recipes, top_k=2)
-    similar_recipes = [
-        next(r for r in recipes if r["id"] == recipe_id)
-        for recipe_id, _ in similar_ids
-    ]
+    similar_ids = retrieve_similar(query_recipe_id, recipes, top_k=2, index=recipes_by_id,
+                                   ingredient_matrix=ingredient_matrix)
+    similar_recipes = [recipes_by_id[recipe_id] for recipe_id, _ in similar_ids]
     print(f"Retrieved: {', '.join(r['name'] for r in similar_recipes)}")
     
     # Step 3: Generate adaptations
@@ -121,9 +129,15 @@ if __name__ == "__main__":
         "recipe_003"   # Beef Tacos → vegetarian
     ]
     
+    # Load and index recipes once for all test cases
+    recipes = load_recipes()
+    recipes_by_id = build_recipe_index(recipes)
+    ingredient_matrix = build_ingredient_matrix(recipes)
+    
     all_results = []
     for recipe_id in test_cases:
-        result = run_experiment(recipe_id, constraint="vegetarian")
+        result = run_experiment(recipe_id, constraint="vegetarian", recipes=recipes,
+                                recipes_by_id=recipes_by_id, ingredient_matrix=ingredient_matrix)
         all_results.append(result)
     
     # Generate summary
@@ -147,10 +161,10 @@ if __name__ == "__main__":
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_file = output_dir / f"experiment_{timestamp}.json"
     
-    with open(output_file, "w") as f:
-        json.dump({
+    with open(output_file, "wb") as f:
+        f.write(dumps({
             "results": all_results,
             "summary": summary
-        }, f, indent=2)
+        }, indent=True))
     
     print(f"\nResults saved to: {output_file}")
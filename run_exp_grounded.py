@@ -1,15 +1,18 @@
 """Grounded Experiment: Baseline vs Grounded adaptation comparison."""
-import json
 import random
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 from tqdm import tqdm
 
 from utils.recipe_utils import load_recipes
-from retrieval.grounded_retrieval import retrieve_similar_recipes, extract_allowed_ingredients
+from utils.json_io import dumps
+from retrieval.grounded_retrieval import build_corpus_index, retrieve_similar_recipes, extract_allowed_ingredients
+from generation import _llm_cache
 from generation.grounded_generation import baseline_adapt, grounded_adapt
 from evaluation.grounded_checker import evaluate_grounded
+from evaluation.summary import SummaryAccumulator
 
 
 # === CONFIG ===
@@ -18,6 +21,30 @@ TOP_K = 5                 # Number of recipes to retrieve
 MODEL = "llama3.2:3b"     # LLM model
 CONSTRAINT = "vegetarian"
 RANDOM_SEED = 42          # For reproducibility
+MAX_WORKERS = 8           # Concurrent LLM requests (set OLLAMA_NUM_PARALLEL on the server to match)
+LLM_CACHE = False         # Reuse on-disk responses for identical prompts (e.g. to resume a crashed run)
+
+
+def generate_example(base, corpus_index):
+    """
+    Retrieve and generate both adaptations for one base recipe.
+    
+    Runs in a worker thread; evaluation stays on the main thread.
+    
+    Returns:
+        tuple: (retrieved, output_baseline, output_grounded)
+    """
+    # Retrieve similar recipes
+    retrieved = retrieve_similar_recipes(base, corpus_index, top_k=TOP_K)
+    retrieved_recipes = [r for r, _score in retrieved]
+    
+    # Generate baseline adaptation
+    output_baseline = baseline_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
+    
+    # Generate grounded adaptation
+    output_grounded = grounded_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
+    
+    return retrieved, output_baseline, output_grounded
 
 
 def run_experiment():
@@ -39,6 +66,9 @@ def run_experiment():
     # Set seed for reproducibility
     random.seed(RANDOM_SEED)
     
+    if LLM_CACHE:
+        _llm_cache.enable()
+    
     # Load data
     print("[1/5] Loading data...")
     data = load_recipes(dataset="recipepairs")
@@ -46,6 +76,7 @@ def run_experiment():
     
     # Build corpus from all targets (vegetarian recipes)
     corpus = [pair["target"] for pair in pairs]
+    corpus_index = build_corpus_index(corpus)  # Tokenize corpus once, not per query
     print(f"  Corpus: {len(corpus)} vegetarian recipes")
     
     # Extract base recipes
@@ -58,115 +89,81 @@ def run_experiment():
     
     # Run experiment for each example
     print(f"\n[3/5] Running experiment...")
-    results = []
-    
-    for base in tqdm(test_bases, desc="Adapting recipes", unit="recipe"):
-        # Retrieve similar recipes
-        retrieved = retrieve_similar_recipes(base, corpus, top_k=TOP_K)
-        retrieved_recipes = [r for r, _score in retrieved]
-        
-        # Extract allowed ingredients
-        allowed = extract_allowed_ingredients(retrieved)
-        
-        # Generate baseline adaptation
-        output_baseline = baseline_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
-        
-        # Generate grounded adaptation
-        output_grounded = grounded_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
-        
-        # Evaluate both
-        eval_baseline = evaluate_grounded(output_baseline, allowed)
-        eval_grounded = evaluate_grounded(output_grounded, allowed)
-        
-        # Store result
-        result = {
-            "example_id": len(results) + 1,
-            "base_recipe": {
-                "name": base["name"],
-                "ingredients": base["ingredients"]
-            },
-            "retrieved_recipes": [
-                {"name": r["name"], "score": s} 
-                for r, s in retrieved
-            ],
-            "allowed_ingredients": list(allowed),
-            "baseline": {
-                "output": output_baseline,
-                "evaluation": eval_baseline
-            },
-            "grounded": {
-                "output": output_grounded,
-                "evaluation": eval_grounded
-            }
-        }
-        results.append(result)
+    results_dir = Path("results")
+    results_dir.mkdir(exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_file = results_dir / f"grounded_exp_k{TOP_K}_{timestamp}.ndjson"
+    
+    # Each result is written as one JSON line as soon as it is done, so memory
+    # stays flat and a killed run keeps its finished examples. Only running
+    # summary counters are kept.
+    summary_acc = SummaryAccumulator()
+    
+    # LLM calls overlap across worker threads; results are consumed in input order
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    futures = [executor.submit(generate_example, base, corpus_index) for base in test_bases]
+    
+    try:
+        with open(results_file, "ab") as f:
+            progress = tqdm(zip(test_bases, futures), total=len(futures),
+                            desc="Adapting recipes", unit="recipe")
+            for example_id, (base, future) in enumerate(progress, 1):
+                retrieved, output_baseline, output_grounded = future.result()
+                
+                # Extract allowed ingredients
+                allowed = extract_allowed_ingredients(retrieved, corpus_index)
+                
+                # Evaluate both
+                eval_baseline = evaluate_grounded(output_baseline, allowed)
+                eval_grounded = evaluate_grounded(output_grounded, allowed)
+                
+                # Store result
+                result = {
+                    "example_id": example_id,
+                    "base_recipe": {
+                        "name": base["name"],
+                        "ingredients": base["ingredients"]
+                    },
+                    "retrieved_recipes": [
+                        {"name": r["name"], "score": s} 
+                        for r, s in retrieved
+                    ],
+                    "allowed_ingredients": list(allowed),
+                    "baseline": {
+                        "output": output_baseline,
+                        "evaluation": eval_baseline
+                    },
+                    "grounded": {
+                        "output": output_grounded,
+                        "evaluation": eval_grounded
+                    }
+                }
+                f.write(dumps(result) + b"\n")
+                f.flush()
+                summary_acc.add(result)
+    finally:
+        # On error, drop queued examples instead of waiting for them
+        executor.shutdown(cancel_futures=True)
+    
+    print(f"  Results streamed to: {results_file}")
     
     # Compute summary statistics
     print(f"\n[4/5] Computing summary statistics...")
-    summary = compute_summary(results)
+    summary = summary_acc.finalize()
     
-    # Save results
-    print(f"\n[5/5] Saving results...")
-    save_results(results, summary)
+    # Save summary
+    print(f"\n[5/5] Saving summary...")
+    save_results(summary, timestamp, results_file)
     
     # Print summary
     print_summary(summary)
     
-    return results, summary
+    return results_file, summary
 
 
-def compute_summary(results):
-    """Compute aggregate statistics from results."""
-    n = len(results)
-    
-    # Baseline stats
-    baseline_constraint_violations = sum(
-        1 for r in results if r["baseline"]["evaluation"]["constraint_check"]["violated"]
-    )
-    baseline_grounding_violations = sum(
-        1 for r in results if r["baseline"]["evaluation"]["grounding_check"]["violated"]
-    )
-    baseline_avg_novel = sum(
-        r["baseline"]["evaluation"]["grounding_check"]["count"] for r in results
-    ) / n
-    
-    # Grounded stats
-    grounded_constraint_violations = sum(
-        1 for r in results if r["grounded"]["evaluation"]["constraint_check"]["violated"]
-    )
-    grounded_grounding_violations = sum(
-        1 for r in results if r["grounded"]["evaluation"]["grounding_check"]["violated"]
-    )
-    grounded_avg_novel = sum(
-        r["grounded"]["evaluation"]["grounding_check"]["count"] for r in results
-    ) / n
-    
-    return {
-        "num_examples": n,
-        "baseline": {
-            "constraint_violation_count": baseline_constraint_violations,
-            "constraint_violation_rate": baseline_constraint_violations / n,
-            "grounding_violation_count": baseline_grounding_violations,
-            "grounding_violation_rate": baseline_grounding_violations / n,
-            "avg_novel_ingredients": baseline_avg_novel
-        },
-        "grounded": {
-            "constraint_violation_count": grounded_constraint_violations,
-            "constraint_violation_rate": grounded_constraint_violations / n,
-            "grounding_violation_count": grounded_grounding_violations,
-            "grounding_violation_rate": grounded_grounding_violations / n,
-            "avg_novel_ingredients": grounded_avg_novel
-        }
-    }
-
-
-def save_results(results, summary):
-    """Save results to JSON file."""
-    results_dir = Path("results")
-    results_dir.mkdir(exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = results_dir / f"grounded_exp_k{TOP_K}_{timestamp}.json"
+def save_results(summary, timestamp, results_file):
+    """Save run metadata and summary to JSON, next to the streamed results file."""
+    filename = results_file.with_suffix(".json")
     
     output = {
         "metadata": {
@@ -176,15 +173,16 @@ def save_results(results, summary):
                 "top_k": TOP_K,
                 "model": MODEL,
                 "constraint": CONSTRAINT,
-                "random_seed": RANDOM_SEED
+                "random_seed": RANDOM_SEED,
+                "llm_cache": LLM_CACHE
             }
         },
         "summary": summary,
-        "results": results
+        "results_file": results_file.name
     }
     
-    with open(filename, "w") as f:
-        json.dump(output, f, indent=2)
+    with open(filename, "wb") as f:
+        f.write(dumps(output))
     
     print(f"  Saved to: {filename}")
 
@@ -2,16 +2,19 @@
 
 Runs experiment with multiple top-k values for overnight execution.
 """
-import json
 import random
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 from utils.recipe_utils import load_recipes
-from retrieval.grounded_retrieval import retrieve_similar_recipes, extract_allowed_ingredients
+from utils.json_io import dumps
+from retrieval.grounded_retrieval import build_corpus_index, retrieve_similar_recipes, extract_allowed_ingredients
+from generation import _llm_cache
 from generation.grounded_generation import baseline_adapt, grounded_adapt
 from evaluation.grounded_checker import evaluate_grounded
+from evaluation.summary import SummaryAccumulator
 
 
 # === CONFIG ===
@@ -21,131 +24,119 @@ MODEL = "llama3.2:3b"     # LLM model
 CONSTRAINT = "vegetarian"
 RANDOM_SEED = 42          # For reproducibility
 PROGRESS_INTERVAL = 10    # Print progress every N examples
+MAX_WORKERS = 8           # Concurrent LLM requests (set OLLAMA_NUM_PARALLEL on the server to match)
+LLM_CACHE = False         # Reuse on-disk responses for identical prompts (e.g. to resume a crashed run)
 
 
-def run_single_experiment(test_bases, corpus, top_k):
+def generate_example(base, retrieved):
+    """
+    Generate both adaptations for one base recipe from its retrieved recipes.
+    
+    Runs in a worker thread; evaluation stays on the main thread.
+    
+    Returns:
+        tuple: (output_baseline, output_grounded)
+    """
+    retrieved_recipes = [r for r, _score in retrieved]
+    
+    # Generate baseline adaptation
+    output_baseline = baseline_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
+    
+    # Generate grounded adaptation
+    output_grounded = grounded_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
+    
+    return output_baseline, output_grounded
+
+
+def run_single_experiment(base_recipes, test_indices, retrieved_all, top_k, results_file,
+                          corpus_index=None):
     """
     Run experiment for a single top_k value.
     
+    test_indices selects the test examples from base_recipes; the same
+    indices are shared by every k value.
+    
+    retrieved_all holds each test base's retrieval at the largest k; the
+    ranking does not depend on k, so the first top_k entries are exactly
+    the top_k retrieval. corpus_index (the index retrieved from) lets allowed
+    ingredients reuse its precomputed ingredient sets.
+    
+    Each result (including errors) is appended to results_file as one JSON
+    line as soon as it is done, so memory stays flat and a killed run keeps
+    its finished examples. Only running summary counters are kept.
+    
     Returns:
-        tuple: (results list, summary dict)
+        summary dict (None if every example failed)
     """
-    results = []
+    summary_acc = SummaryAccumulator()
+    retrieved_k = [retrieved[:top_k] for retrieved in retrieved_all]
     
-    for i, base in enumerate(test_bases, 1):
-        if i % PROGRESS_INTERVAL == 0 or i == 1:
-            print(f"  [{i}/{len(test_bases)}] {base['name'][:40]}...")
+    # LLM calls overlap across worker threads; results are consumed in input order
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, open(results_file, "ab") as f:
+        futures = [
+            executor.submit(generate_example, base_recipes[base_idx], retrieved)
+            for base_idx, retrieved in zip(test_indices, retrieved_k)
+        ]
         
-        try:
-            # Retrieve similar recipes
-            retrieved = retrieve_similar_recipes(base, corpus, top_k=top_k)
-            retrieved_recipes = [r for r, _score in retrieved]
-            
-            # Extract allowed ingredients
-            allowed = extract_allowed_ingredients(retrieved)
-            
-            # Generate baseline adaptation
-            output_baseline = baseline_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
+        for i, (base_idx, retrieved, future) in enumerate(zip(test_indices, retrieved_k, futures), 1):
+            base = base_recipes[base_idx]
+            if i % PROGRESS_INTERVAL == 0 or i == 1:
+                print(f"  [{i}/{len(test_indices)}] {base['name'][:40]}...")
             
-            # Generate grounded adaptation
-            output_grounded = grounded_adapt(base, retrieved_recipes, CONSTRAINT, MODEL)
-            
-            # Evaluate both
-            eval_baseline = evaluate_grounded(output_baseline, allowed)
-            eval_grounded = evaluate_grounded(output_grounded, allowed)
-            
-            # Store result
-            result = {
-                "example_id": i,
-                "base_recipe": {
-                    "name": base["name"],
-                    "ingredients": base["ingredients"]
-                },
-                "retrieved_recipes": [
-                    {"name": r["name"], "score": s} 
-                    for r, s in retrieved
-                ],
-                "allowed_ingredients": list(allowed),
-                "baseline": {
-                    "output": output_baseline,
-                    "evaluation": eval_baseline
-                },
-                "grounded": {
-                    "output": output_grounded,
-                    "evaluation": eval_grounded
+            try:
+                output_baseline, output_grounded = future.result()
+                
+                # Extract allowed ingredients
+                allowed = extract_allowed_ingredients(retrieved, corpus_index)
+                
+                # Evaluate both
+                eval_baseline = evaluate_grounded(output_baseline, allowed)
+                eval_grounded = evaluate_grounded(output_grounded, allowed)
+                
+                # Store result
+                result = {
+                    "example_id": i,
+                    "base_recipe": {
+                        "name": base["name"],
+                        "ingredients": base["ingredients"]
+                    },
+                    "retrieved_recipes": [
+                        {"name": r["name"], "score": s} 
+                        for r, s in retrieved
+                    ],
+                    "allowed_ingredients": list(allowed),
+                    "baseline": {
+                        "output": output_baseline,
+                        "evaluation": eval_baseline
+                    },
+                    "grounded": {
+                        "output": output_grounded,
+                        "evaluation": eval_grounded
+                    }
+                }
+                summary_acc.add(result)
+                
+            except Exception as e:
+                print(f"  ERROR on example {i}: {e}")
+                # Store error result
+                result = {
+                    "example_id": i,
+                    "base_recipe": {"name": base["name"], "ingredients": base["ingredients"]},
+                    "error": str(e)
                 }
-            }
-            results.append(result)
             
-        except Exception as e:
-            print(f"  ERROR on example {i}: {e}")
-            # Store error result
-            results.append({
-                "example_id": i,
-                "base_recipe": {"name": base["name"], "ingredients": base["ingredients"]},
-                "error": str(e)
-            })
+            f.write(dumps(result) + b"\n")
+            f.flush()
     
     # Compute summary (excluding errors)
-    valid_results = [r for r in results if "error" not in r]
-    summary = compute_summary(valid_results) if valid_results else None
+    summary = summary_acc.finalize()
     
-    return results, summary
-
-
-def compute_summary(results):
-    """Compute aggregate statistics from results."""
-    n = len(results)
-    if n == 0:
-        return None
-    
-    # Baseline stats
-    baseline_constraint_violations = sum(
-        1 for r in results if r["baseline"]["evaluation"]["constraint_check"]["violated"]
-    )
-    baseline_grounding_violations = sum(
-        1 for r in results if r["baseline"]["evaluation"]["grounding_check"]["violated"]
-    )
-    baseline_avg_novel = sum(
-        r["baseline"]["evaluation"]["grounding_check"]["count"] for r in results
-    ) / n
-    
-    # Grounded stats
-    grounded_constraint_violations = sum(
-        1 for r in results if r["grounded"]["evaluation"]["constraint_check"]["violated"]
-    )
-    grounded_grounding_violations = sum(
-        1 for r in results if r["grounded"]["evaluation"]["grounding_check"]["violated"]
-    )
-    grounded_avg_novel = sum(
-        r["grounded"]["evaluation"]["grounding_check"]["count"] for r in results
-    ) / n
-    
-    return {
-        "num_examples": n,
-        "baseline": {
-            "constraint_violation_count": baseline_constraint_violations,
-            "constraint_violation_rate": baseline_constraint_violations / n,
-            "grounding_violation_count": baseline_grounding_violations,
-            "grounding_violation_rate": baseline_grounding_violations / n,
-            "avg_novel_ingredients": baseline_avg_novel
-        },
-        "grounded": {
-            "constraint_violation_count": grounded_constraint_violations,
-            "constraint_violation_rate": grounded_constraint_violations / n,
-            "grounding_violation_count": grounded_grounding_violations,
-            "grounding_violation_rate": grounded_grounding_violations / n,
-            "avg_novel_ingredients": grounded_avg_novel
-        }
-    }
+    return summary
 
 
-def save_results(results, summary, top_k, timestamp):
-    """Save results to JSON file."""
-    results_dir = Path("results")
-    results_dir.mkdir(exist_ok=True)
-    
-    filename = results_dir / f"grounded_exp_k{top_k}_{timestamp}.json"
+def save_results(summary, top_k, timestamp, results_file):
+    """Save run metadata and summary to JSON, next to the streamed results file."""
+    filename = results_file.with_suffix(".json")
     
     output = {
         "metadata": {
@@ -155,15 +146,16 @@ def save_results(results, summary, top_k, timestamp):
                 "top_k": top_k,
                 "model": MODEL,
                 "constraint": CONSTRAINT,
-                "random_seed": RANDOM_SEED
+                "random_seed": RANDOM_SEED,
+                "llm_cache": LLM_CACHE
             }
         },
         "summary": summary,
-        "results": results
+        "results_file": results_file.name
     }
     
-    with open(filename, "w") as f:
-        json.dump(output, f, indent=2)
+    with open(filename, "wb") as f:
+        f.write(dumps(output))
     
     return filename
 
@@ -218,6 +210,9 @@ def main():
     # Set seed for reproducibility
     random.seed(RANDOM_SEED)
     
+    if LLM_CACHE:
+        _llm_cache.enable()
+    
     # Load data
     print("[1/4] Loading data...")
     data = load_recipes(dataset="recipepairs")
@@ -225,32 +220,47 @@ def main():
     
     # Build corpus from all targets (vegetarian recipes)
     corpus = [pair["target"] for pair in pairs]
+    corpus_index = build_corpus_index(corpus)  # Tokenize corpus once, not per query
     print(f"  Corpus: {len(corpus)} vegetarian recipes")
     
     # Extract base recipes
     base_recipes = [pair["base"] for pair in pairs]
     print(f"  Base recipes: {len(base_recipes)} meat dishes")
     
-    # Sample test examples (same for all k values)
+    # Sample test examples (same for all k values) as indices into base_recipes.
+    # random.sample picks the same positions for range(n) as for the list itself,
+    # so a given seed selects the same examples as sampling the recipes directly.
     print(f"\n[2/4] Sampling {NUM_EXAMPLES} test examples...")
     if NUM_EXAMPLES > len(base_recipes):
         print(f"  WARNING: Requested {NUM_EXAMPLES} but only {len(base_recipes)} available. Using all.")
-        test_bases = base_recipes
+        test_indices = range(len(base_recipes))
     else:
-        test_bases = random.sample(base_recipes, NUM_EXAMPLES)
-    print(f"  Sampled {len(test_bases)} examples")
+        test_indices = random.sample(range(len(base_recipes)), NUM_EXAMPLES)
+    print(f"  Sampled {len(test_indices)} examples")
+    
+    # Rankings don't depend on k: retrieve once at the largest k, slice per k
+    max_k = max(TOP_K_VALUES)
+    print(f"  Retrieving top-{max_k} for each example (shared by all k values)")
+    retrieved_all = [
+        retrieve_similar_recipes(base_recipes[i], corpus_index, top_k=max_k) for i in test_indices
+    ]
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results_dir = Path("results")
+    results_dir.mkdir(exist_ok=True)
     all_summaries = {}
     
     # Run experiment for each k value
     for k_idx, top_k in enumerate(TOP_K_VALUES, 1):
         print(f"\n[3/4] Running experiment with k={top_k} ({k_idx}/{len(TOP_K_VALUES)})...")
         
-        results, summary = run_single_experiment(test_bases, corpus, top_k)
+        results_file = results_dir / f"grounded_exp_k{top_k}_{timestamp}.ndjson"
+        summary = run_single_experiment(base_recipes, test_indices, retrieved_all, top_k,
+                                        results_file, corpus_index)
+        print(f"  Results streamed to: {results_file}")
         
-        # Save results
-        filename = save_results(results, summary, top_k, timestamp)
+        # Save summary
+        filename = save_results(summary, top_k, timestamp, results_file)
         print(f"  Saved: {filename}")
         
         # Print summary
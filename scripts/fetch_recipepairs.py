@@ -8,17 +8,31 @@ Downloads from HuggingFace, filters for pairs where:
 Outputs pairs to data/recipepairs_veg_eval.json
 """
 
+import gc
 import json
+from collections import defaultdict
+import re
 from pathlib import Path
 from glob import glob
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+try:
+    import orjson  # Optional: pip install orjson (faster encoder)
+except ImportError:
+    orjson = None
 
 # --- Config ---
 OUTPUT_PATH = Path(__file__).parent.parent / "data" / "recipepairs_veg_eval.json"
 TARGET_COUNT = 10000
 MAX_PER_BASE = 5    # Max pairs per base recipe (limits duplicates)
 MAX_PER_TARGET = 5  # Max pairs per target recipe (limits duplicates)
+PROGRESS_EVERY = 500  # Print every Nth accepted item
 MEAT_KEYWORDS = {"chicken", "beef", "pork", "lamb", "turkey", "bacon", "sausage", "ham", "meat", "steak", "fish", "shrimp", "salmon"}
+MEAT_RE = re.compile("|".join(re.escape(meat) for meat in sorted(MEAT_KEYWORDS)), re.IGNORECASE)
 
 # HuggingFace paths
 CACHE_BASE = Path.home() / ".cache/huggingface/hub/datasets--lishuyang--recipepairs/snapshots"
@@ -26,88 +40,134 @@ HF_RECIPES_URL = "hf://datasets/lishuyang/recipepairs/recipes.parquet"
 HF_PAIRS_URL = "hf://datasets/lishuyang/recipepairs/pairs.parquet"
 
 
-def load_parquet(table_name: str) -> pd.DataFrame:
-    """Load parquet from local cache if available, else download from HuggingFace."""
+def load_parquet(table_name: str, columns: list = None) -> pd.DataFrame:
+    """Load parquet from local cache if available, else download from HuggingFace.
+
+    Only the given columns are read (parquet is columnar, the rest are never decoded),
+    into Arrow-backed columns rather than Python objects.
+    """
     # Try local cache first (fast)
     cache_pattern = str(CACHE_BASE / f"*/{table_name}.parquet")
     matches = glob(cache_pattern)
     if matches:
         print(f"  (using local cache)")
-        return pd.read_parquet(matches[0])
+        return pd.read_parquet(matches[0], columns=columns, dtype_backend="pyarrow")
     
     # Fall back to HuggingFace URL (portable, but slower)
     print(f"  (downloading from HuggingFace...)")
     url = HF_RECIPES_URL if table_name == "recipes" else HF_PAIRS_URL
-    return pd.read_parquet(url)
+    return pd.read_parquet(url, columns=columns, dtype_backend="pyarrow")
+
+
+def list_contains(values: pd.Series, item: str) -> np.ndarray:
+    """Boolean mask of the rows whose list value contains item, computed in Arrow."""
+    lists = pa.array(values)
+    hit_rows = pc.filter(pc.list_parent_indices(lists), pc.equal(pc.list_flatten(lists), item))
+    mask = np.zeros(len(lists), dtype=bool)
+    mask[hit_rows.to_numpy()] = True
+    return mask
+
+
+def dump_json(obj) -> bytes:
+    """Serialize obj to compact UTF-8 JSON, with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
 
 def main():
     print("Loading recipes table...")
-    recipes_df = load_parquet("recipes")
+    recipes_df = load_parquet("recipes", columns=["id", "name", "ingredients", "steps"])
+    recipes_df = recipes_df.astype({"id": "int64"})
     print(f"  → {len(recipes_df):,} recipes loaded")
 
     print("Loading pairs table...")
-    pairs_df = load_parquet("pairs")
+    pairs_df = load_parquet("pairs", columns=["base", "target", "categories"])
+    pairs_df = pairs_df.astype({"base": "int64", "target": "int64"})
     print(f"  → {len(pairs_df):,} pairs loaded")
 
-    # Index recipes by ID for O(1) lookup
-    print("Building recipe lookup index...")
-    recipe_lookup = {row["id"]: row.to_dict() for _, row in recipes_df.iterrows()}
-
-    def is_meat_to_veg(pair):
-        """Check if pair is meat→vegetarian."""
-        # Target must be vegetarian
-        if "vegetarian" not in pair["categories"]:
-            return False
-        
-        # Get base recipe
-        base = recipe_lookup.get(pair["base"])
-        if not base:
-            return False
-        
-        # Base must contain a meat keyword
-        ingredients_text = " ".join(base["ingredients"]).lower()
-        return any(meat in ingredients_text for meat in MEAT_KEYWORDS)
+    # Meat→vegetarian test, done once per recipe / as a column mask instead of
+    # per pair: target is tagged vegetarian, base recipe contains a meat keyword
+    print("Finding meat→vegetarian candidate pairs...")
+    veg_mask = list_contains(pairs_df["categories"], "vegetarian")
+    veg_target_pairs = pairs_df[veg_mask]
+
+    # Ingredient text per recipe, built only for bases of vegetarian-target pairs
+    # (later rows win for a repeated id, as in the lookups below)
+    bases = recipes_df[recipes_df["id"].isin(veg_target_pairs["base"])]
+    ingredient_blob_by_id = {
+        recipe_id: " ".join(ingredients)
+        for recipe_id, ingredients in zip(bases["id"].tolist(), bases["ingredients"])
+    }
+    meat_recipe_ids = {
+        recipe_id for recipe_id, blob in ingredient_blob_by_id.items() if MEAT_RE.search(blob)
+    }
 
-    # Filter pairs
+    candidates = veg_target_pairs[veg_target_pairs["base"].isin(meat_recipe_ids)]
+    print(f"  → {len(candidates):,} candidate pairs")
+
+    # Attach base and target recipe fields to each candidate pair with two hash
+    # joins. Only recipes in a candidate pair are needed; a repeated recipe id
+    # keeps its last row. Ingredient arrays become plain lists once per recipe.
+    print("Joining recipes onto candidate pairs...")
+    needed_ids = pd.concat([candidates["base"], candidates["target"]]).unique()
+    needed = recipes_df[recipes_df["id"].isin(needed_ids)].drop_duplicates("id", keep="last")
+    needed = needed.assign(ingredients=needed["ingredients"].map(list))
+    enriched = (
+        candidates[["base", "target"]]
+        .merge(needed.add_prefix("base_").rename(columns={"base_id": "base"}), on="base")
+        .merge(needed.add_prefix("target_").rename(columns={"target_id": "target"}), on="target")
+    )
+
+    # Only the joined candidates are needed from here on
+    del recipes_df, pairs_df, veg_target_pairs, bases, ingredient_blob_by_id, candidates, needed
+    gc.collect()
+
+    # Apply per-base/per-target limits in pair order. This stays a loop: a pair
+    # skipped for its target must not use up a slot of its base.
     print(f"Filtering for meat→vegetarian pairs (target: {TARGET_COUNT}, max {MAX_PER_BASE}/base, max {MAX_PER_TARGET}/target)...")
     veg_pairs = []
-    base_counts = {}    # Count how many times each base appears
-    target_counts = {}  # Count how many times each target appears
-    for _, pair in pairs_df.iterrows():
-        base_id = pair["base"]
-        target_id = pair["target"]
+    base_counts = defaultdict(int)    # Count how many times each base appears
+    target_counts = defaultdict(int)  # Count how many times each target appears
+    saturated_bases = set()    # Bases that reached MAX_PER_BASE
+    saturated_targets = set()  # Targets that reached MAX_PER_TARGET
+    for pair in enriched.itertuples(index=False):
+        base_id = pair.base
+        target_id = pair.target
         
-        # Check limits
-        if base_counts.get(base_id, 0) >= MAX_PER_BASE:
+        # Check limits (a saturated base/target stays saturated)
+        if base_id in saturated_bases or target_id in saturated_targets:
             continue
-        if target_counts.get(target_id, 0) >= MAX_PER_TARGET:
-            continue
-            
-        if is_meat_to_veg(pair):
-            base = recipe_lookup[base_id]
-            target = recipe_lookup[target_id]
-            base_counts[base_id] = base_counts.get(base_id, 0) + 1
-            target_counts[target_id] = target_counts.get(target_id, 0) + 1
-            veg_pairs.append({
-                "base": {
-                    "id": int(base["id"]),
-                    "name": base["name"],
-                    "ingredients": list(base["ingredients"]),
-                    "steps": base["steps"]  # Keep as string (that's the original format)
-                },
-                "target": {
-                    "id": int(target["id"]),
-                    "name": target["name"],
-                    "ingredients": list(target["ingredients"]),
-                    "steps": target["steps"]  # Keep as string
-                },
-                "constraint": "vegetarian"
-            })
-            print(f"  [{len(veg_pairs)}/{TARGET_COUNT}] {base['name']} → {target['name']}")
+        
+        base_name = pair.base_name
+        target_name = pair.target_name
+        base_counts[base_id] += 1
+        target_counts[target_id] += 1
+        if base_counts[base_id] >= MAX_PER_BASE:
+            saturated_bases.add(base_id)
+        if target_counts[target_id] >= MAX_PER_TARGET:
+            saturated_targets.add(target_id)
+        veg_pairs.append({
+            "base": {
+                "id": base_id,
+                "name": base_name,
+                "ingredients": pair.base_ingredients,
+                "steps": pair.base_steps  # Keep as string (that's the original format)
+            },
+            "target": {
+                "id": target_id,
+                "name": target_name,
+                "ingredients": pair.target_ingredients,
+                "steps": pair.target_steps  # Keep as string
+            },
+            "constraint": "vegetarian"
+        })
+        if len(veg_pairs) % PROGRESS_EVERY == 0:
+            print(f"  [{len(veg_pairs)}/{TARGET_COUNT}] {base_name} → {target_name}")
         
         if len(veg_pairs) >= TARGET_COUNT:
             break
+    print(f"  → {len(veg_pairs):,} pairs selected")
 
     # Save output
     output = {
@@ -120,8 +180,16 @@ def main():
     }
 
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    OUTPUT_PATH.write_text(json.dumps(output, indent=2))
+    OUTPUT_PATH.write_bytes(dump_json(output))
     print(f"Saved to {OUTPUT_PATH}")
 
+    # Columnar copy next to the JSON; utils.recipe_utils.load_recipes() prefers it
+    parquet_path = OUTPUT_PATH.with_suffix(".parquet")
+    table = pa.Table.from_pylist(veg_pairs).replace_schema_metadata(
+        {"metadata": json.dumps(output["metadata"])}
+    )
+    pq.write_table(table, parquet_path, compression="zstd")
+    print(f"Saved to {parquet_path}")
+
 if __name__ == "__main__":
     main()
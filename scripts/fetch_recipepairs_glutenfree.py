@@ -7,11 +7,20 @@ Downloads from HuggingFace, filters for targets where:
 Outputs recipes to data/recipepairs_glutenfree_eval.json
 """
 
+import gc
 import json
+from collections import defaultdict
 from pathlib import Path
 from glob import glob
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+try:
+    import orjson  # Optional: pip install orjson (faster encoder)
+except ImportError:
+    orjson = None
 
 # --- Config ---
 OUTPUT_PATH = Path(__file__).parent.parent / "data" / "recipepairs_glutenfree_eval.json"
@@ -23,30 +32,53 @@ CACHE_BASE = Path.home() / ".cache/huggingface/hub/datasets--lishuyang--recipepa
 HF_RECIPES_URL = "hf://datasets/lishuyang/recipepairs/recipes.parquet"
 HF_PAIRS_URL = "hf://datasets/lishuyang/recipepairs/pairs.parquet"
 
-def load_parquet(table_name: str) -> pd.DataFrame:
-    """Load parquet from local cache if available, else download from HuggingFace."""
+def load_parquet(table_name: str, columns: list = None) -> pd.DataFrame:
+    """Load parquet from local cache if available, else download from HuggingFace.
+
+    Only the given columns are read (parquet is columnar, the rest are never decoded),
+    into Arrow-backed columns rather than Python objects.
+    """
     cache_pattern = str(CACHE_BASE / f"*/{table_name}.parquet")
     matches = glob(cache_pattern)
     if matches:
         print(f"  (using local cache)")
-        return pd.read_parquet(matches[0])
+        return pd.read_parquet(matches[0], columns=columns, dtype_backend="pyarrow")
     print(f"  (downloading from HuggingFace...)")
     url = HF_RECIPES_URL if table_name == "recipes" else HF_PAIRS_URL
-    return pd.read_parquet(url)
+    return pd.read_parquet(url, columns=columns, dtype_backend="pyarrow")
+
+def category_mask(categories: pd.Series, tag: str) -> np.ndarray:
+    """
+    Boolean mask of the rows whose category list contains tag, computed in Arrow.
+
+    Categories are normalized like normalize_categories() in main() (strip,
+    lowercase, "-" -> "_") before comparing, so tag must be in normalized form.
+    """
+    lists = pa.array(categories)
+    flat = pc.utf8_lower(pc.utf8_trim_whitespace(pc.list_flatten(lists)))
+    flat = pc.replace_substring(flat, "-", "_")
+    hit_rows = pc.filter(pc.list_parent_indices(lists), pc.equal(flat, tag))
+    mask = np.zeros(len(lists), dtype=bool)
+    mask[hit_rows.to_numpy()] = True
+    return mask
+
+def dump_json(obj) -> bytes:
+    """Serialize obj to compact UTF-8 JSON, with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
 
 def main():
     print("Loading recipes table...")
-    recipes_df = load_parquet("recipes")
+    recipes_df = load_parquet("recipes", columns=["id", "name", "ingredients", "steps", "categories"])
+    recipes_df = recipes_df.astype({"id": "int64"})
     print(f"  → {len(recipes_df):,} recipes loaded")
 
     print("Loading pairs table...")
-    pairs_df = load_parquet("pairs")
+    pairs_df = load_parquet("pairs", columns=["target"])
+    pairs_df = pairs_df.astype({"target": "int64"})
     print(f"  → {len(pairs_df):,} pairs loaded")
 
-    # Index recipes by ID for O(1) lookup
-    print("Building recipe lookup index...")
-    recipe_lookup = {row["id"]: row.to_dict() for _, row in recipes_df.iterrows()}
-
     def normalize_categories(cats):
         if isinstance(cats, (list, tuple, np.ndarray)):
             return [str(c).strip().lower().replace("-", "_") for c in cats]
@@ -61,65 +93,79 @@ def main():
             return list(value)
         return [value] if pd.notna(value) else []
 
-    def is_glutenfree_target(pair):
-        """Check target recipe categories for gluten_free/gluten-free tag."""
-        target = recipe_lookup.get(pair["target"])
-        if not target:
-            return False
-        norm = normalize_categories(target.get("categories", []))
-        return "gluten_free" in norm
+    # Tag test and name key once per recipe, as column operations
+    recipes_df["name_key"] = recipes_df["name"].str.strip().str.lower()  # case-insensitive dedup key
+    is_gf = category_mask(recipes_df["categories"], "gluten_free")
+
+    # One row per recipe ID for O(1) lookup (later rows win for a repeated id)
+    print("Building recipe lookup index...")
+    by_id = recipes_df.drop_duplicates("id", keep="last").set_index("id")
+    gf_target_ids = by_id.index[category_mask(by_id["categories"], "gluten_free")]
 
     # Collect unique gluten-free targets (from pairs). If none found, fall back to all recipes.
+    # Each recipe is taken at most once, unique by id and by name (case-insensitive);
+    # the first occurrence wins. Every rejected appearance of an id counts towards
+    # MAX_PER_TARGET, after which the id is never taken.
     print(f"Collecting gluten-free targets (goal: {TARGET_COUNT}, max {MAX_PER_TARGET}/target)...")
-    gf_recipes = []
-    target_counts = {}
-    seen_targets = set()      # unique by target id
-    seen_names = set()        # also dedupe by recipe name (case-insensitive)
-
-    def add_target(target):
-        tid = target["id"]
-        tname = target["name"].strip()
-        key = tname.lower()
-        if target_counts.get(tid, 0) >= MAX_PER_TARGET:
-            return False
-        if tid in seen_targets or key in seen_names:
-            target_counts[tid] = target_counts.get(tid, 0) + 1
-            return False
-        seen_targets.add(tid)
-        seen_names.add(key)
-        target_counts[tid] = target_counts.get(tid, 0) + 1
-        gf_recipes.append({
-            "id": int(target["id"]),
-            "name": target["name"],
-            "ingredients": to_plain_list(target.get("ingredients", [])),
-            "steps": to_plain_list(target.get("steps", [])),
-            "categories": normalize_categories(target.get("categories", [])),
-            "constraint": "gluten-free"
-        })
-        print(f"  [{len(gf_recipes)}/{TARGET_COUNT}] {tname}")
-        return True
-
-    # Pass 1: from pairs
-    for _, pair in pairs_df.iterrows():
-        if len(gf_recipes) >= TARGET_COUNT:
-            break
-        if not is_glutenfree_target(pair):
-            continue
-        target = recipe_lookup.get(pair["target"])
-        if not target:
-            continue
-        add_target(target)
+
+    # Pass 1: from pairs, in order of first appearance as a target. Here an id
+    # always has the same name, so deduping by id and then by name is exact.
+    gf_pair_targets = pairs_df.loc[pairs_df["target"].isin(gf_target_ids), "target"]
+    selected = by_id.loc[gf_pair_targets.drop_duplicates()].reset_index()
+    selected = selected.drop_duplicates("name_key").head(TARGET_COUNT)
+    print(f"  → {len(selected):,} from pairs")
 
     # Pass 2 (fallback): from all recipes if we didn't reach target count
-    if len(gf_recipes) < TARGET_COUNT:
-        print(f"Fallback: scanning all recipes (need {TARGET_COUNT - len(gf_recipes)} more)...")
-        for _, row in recipes_df.iterrows():
-            if len(gf_recipes) >= TARGET_COUNT:
+    if len(selected) < TARGET_COUNT:
+        need = TARGET_COUNT - len(selected)
+        print(f"Fallback: scanning all recipes (need {need} more)...")
+        # Rows of repeated ids can carry different names, so id and name are
+        # checked together in one ordered pass. Ids taken in pass 1 can never
+        # be taken again and are dropped up front.
+        fallback = recipes_df[is_gf & ~recipes_df["id"].isin(selected["id"])]
+        target_counts = defaultdict(int, {
+            tid: min(n, MAX_PER_TARGET) for tid, n in gf_pair_targets.value_counts().items()
+        })
+        seen_ids = set(selected["id"].tolist())
+        seen_names = set(selected["name_key"].tolist())
+        keep = []
+        for pos, (tid, key) in enumerate(zip(fallback["id"].tolist(), fallback["name_key"].tolist())):
+            if len(keep) >= need:
                 break
-            norm = normalize_categories(row.get("categories", []))
-            if "gluten_free" not in norm:
+            if target_counts[tid] >= MAX_PER_TARGET:
+                continue
+            target_counts[tid] += 1
+            if tid in seen_ids or key in seen_names:
                 continue
-            add_target(row)
+            seen_ids.add(tid)
+            seen_names.add(key)
+            keep.append(pos)
+        fallback = fallback.iloc[keep]
+        print(f"  → {len(fallback):,} from fallback")
+        selected = pd.concat([selected, fallback], ignore_index=True)
+
+    # Only the selected rows are needed from here on
+    del recipes_df, pairs_df, by_id
+    gc.collect()
+
+    gf_recipes = [
+        {
+            "id": recipe_id,
+            "name": name,
+            "ingredients": to_plain_list(ingredients),
+            "steps": to_plain_list(steps),
+            "categories": normalize_categories(categories),
+            "constraint": "gluten-free"
+        }
+        for recipe_id, name, ingredients, steps, categories in zip(
+            selected["id"].tolist(),
+            selected["name"].tolist(),
+            selected["ingredients"],
+            selected["steps"],
+            selected["categories"]
+        )
+    ]
+    print(f"  → {len(gf_recipes):,} recipes selected")
 
     # Save output
     output = {
@@ -132,7 +178,7 @@ def main():
     }
 
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    OUTPUT_PATH.write_text(json.dumps(output, indent=2))
+    OUTPUT_PATH.write_bytes(dump_json(output))
     print(f"Saved to {OUTPUT_PATH}")
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 import random
 import time
 from utils.recipe_utils import load_recipes
-from retrieval.grounded_retrieval import retrieve_similar_recipes, extract_allowed_ingredients
+from retrieval.grounded_retrieval import build_corpus_index, retrieve_similar_recipes, extract_allowed_ingredients
 from generation.grounded_generation import baseline_adapt, grounded_adapt
 from evaluation.grounded_checker import evaluate_grounded
 
@@ -10,6 +10,7 @@ random.seed(42)
 data = load_recipes(dataset='recipepairs')
 pairs = data['pairs']
 corpus = [p['target'] for p in pairs]
+corpus_index = build_corpus_index(corpus)
 bases = [p['base'] for p in pairs]
 test = random.sample(bases, 5)
 
@@ -18,9 +19,9 @@ start = time.time()
 
 for i, base in enumerate(test, 1):
     t0 = time.time()
-    retrieved = retrieve_similar_recipes(base, corpus, top_k=3)
+    retrieved = retrieve_similar_recipes(base, corpus_index, top_k=3)
     retrieved_recipes = [r for r, _ in retrieved]
-    allowed = extract_allowed_ingredients(retrieved)
+    allowed = extract_allowed_ingredients(retrieved, corpus_index)
     
     out_b = baseline_adapt(base, retrieved_recipes, 'vegetarian', 'llama3.2:3b')
     out_g = grounded_adapt(base, retrieved_recipes, 'vegetarian', 'llama3.2:3b')
@@ -0,0 +1,32 @@
+"""JSON encode/decode helpers that use orjson when it is installed."""
+import json
+
+try:
+    import orjson  # Optional: pip install orjson (C-level encoder/decoder)
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, indent=False):
+    """
+    Serialize obj to UTF-8 JSON bytes.
+
+    Args:
+        obj: JSON-compatible object (str dict keys)
+        indent: Pretty-print with 2-space indentation; otherwise compact
+
+    Returns:
+        bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(raw):
+    """Parse JSON from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
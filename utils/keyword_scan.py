@@ -0,0 +1,113 @@
+"""Single-pass multi-keyword scanning for constraint checks."""
+import re
+from functools import lru_cache
+
+try:
+    import ahocorasick  # Optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+def build_keyword_matcher(keywords):
+    """
+    Build a matcher that finds all keywords in one linear scan of the text.
+
+    Uses an Aho-Corasick automaton if pyahocorasick is installed,
+    otherwise a precompiled alternation regex.
+
+    Args:
+        keywords: Iterable of lowercase keyword strings
+
+    Returns:
+        Opaque matcher for find_keywords()
+    """
+    keywords = tuple(dict.fromkeys(keywords))
+    if not keywords:
+        return keywords, None
+
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return keywords, automaton
+
+    # Zero-width lookahead tries every position, so overlapping keywords are all
+    # seen; longest first so the capture at a position is its longest keyword
+    alternation = "|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+    return keywords, re.compile(rf"(?=\b({alternation}))")
+
+
+@lru_cache(maxsize=32)
+def get_keyword_matcher(keywords):
+    """Cached build_keyword_matcher() for a tuple of keywords."""
+    return build_keyword_matcher(keywords)
+
+
+def _starts_word(text, start):
+    """True if position start is not preceded by a word character."""
+    if start == 0:
+        return True
+    prev = text[start - 1]
+    return not (prev.isalnum() or prev == "_")
+
+
+def find_keywords(matcher, text_lower):
+    """
+    Find which keywords occur in text.
+
+    A hit only counts at the start of a word, so "ham" does not match
+    "graham" or "champagne". Plurals and compounds still match
+    ("sausages", "hamburger"), as with the plain substring check.
+
+    Args:
+        matcher: Matcher from build_keyword_matcher()
+        text_lower: Lowercased text to scan
+
+    Returns:
+        List of found keywords, in the order they were given to the matcher
+    """
+    keywords, engine = matcher
+    if engine is None:
+        return []
+
+    if ahocorasick is not None:
+        hits = {
+            keyword for end, keyword in engine.iter(text_lower)
+            if _starts_word(text_lower, end - len(keyword) + 1)
+        }
+    else:
+        # A shorter keyword matching at the same position is a prefix of the
+        # captured (longest) one
+        longest = set(engine.findall(text_lower))
+        hits = {kw for kw in keywords if any(hit.startswith(kw) for hit in longest)}
+
+    return [kw for kw in keywords if kw in hits]
+
+
+def find_first_keyword(matcher, text_lower):
+    """
+    Return the first keyword hit in text, stopping the scan there.
+
+    Same matching rules as find_keywords(); use when only a yes/no
+    answer is needed.
+
+    Args:
+        matcher: Matcher from build_keyword_matcher()
+        text_lower: Lowercased text to scan
+
+    Returns:
+        First matching keyword, or None
+    """
+    _keywords, engine = matcher
+    if engine is None:
+        return None
+
+    if ahocorasick is not None:
+        for end, keyword in engine.iter(text_lower):
+            if _starts_word(text_lower, end - len(keyword) + 1):
+                return keyword
+        return None
+
+    match = engine.search(text_lower)
+    return match.group(1) if match else None
@@ -2,9 +2,36 @@
 import json
 from pathlib import Path
 
+from utils.json_io import loads
+
 # Default paths
 TOY_RECIPES_PATH = Path(__file__).parent.parent / "data" / "recipes.json"
 RECIPEPAIRS_PATH = Path(__file__).parent.parent / "data" / "recipepairs_veg_eval.json"
+# Columnar copy written by scripts/fetch_recipepairs.py alongside the JSON
+RECIPEPAIRS_PARQUET_PATH = RECIPEPAIRS_PATH.with_suffix(".parquet")
+
+
+def _load_recipepairs_parquet(path):
+    """Read the parquet copy of the eval pairs into the same structure as the JSON."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    metadata = json.loads(table.schema.metadata[b"metadata"])
+    return {"metadata": metadata, "pairs": table.to_pylist()}
+
+
+def _parquet_is_current(parquet_path, json_path):
+    """True if parquet_path exists and is not older than json_path."""
+    if not parquet_path.exists():
+        return False
+    return not json_path.exists() or parquet_path.stat().st_mtime >= json_path.stat().st_mtime
+
+
+def _add_ingredients_lower(pairs):
+    """Store each recipe's lowercased ingredients once, for get_ingredients()."""
+    for pair in pairs:
+        for recipe in (pair["base"], pair["target"]):
+            recipe["_ingredients_lower"] = [ing.lower() for ing in recipe["ingredients"]]
 
 
 def load_recipes(dataset="toy"):
@@ -18,15 +45,22 @@ def load_recipes(dataset="toy"):
     Returns:
         For "toy": list of recipe dicts with 'graph' field
         For "recipepairs": dict with 'pairs' list, each pair has 'base' and 'target'
+                           (each recipe also gets a precomputed '_ingredients_lower' list)
     """
     if dataset == "toy":
-        with open(TOY_RECIPES_PATH) as f:
-            data = json.load(f)
+        with open(TOY_RECIPES_PATH, "rb") as f:
+            data = loads(f.read())
         return data["recipes"]
     
     elif dataset == "recipepairs":
-        with open(RECIPEPAIRS_PATH) as f:
-            data = json.load(f)
+        # Parquet decodes much faster than the pretty-printed JSON; skip it if
+        # the JSON was regenerated without it
+        if _parquet_is_current(RECIPEPAIRS_PARQUET_PATH, RECIPEPAIRS_PATH):
+            data = _load_recipepairs_parquet(RECIPEPAIRS_PARQUET_PATH)
+        else:
+            with open(RECIPEPAIRS_PATH, "rb") as f:
+                data = loads(f.read())
+        _add_ingredients_lower(data["pairs"])
         # Return the full structure (metadata + pairs)
         return data
     
@@ -41,10 +75,14 @@ def get_ingredients(recipe):
     Handles both formats:
     - Toy: recipe["graph"]["ingredients"] = [{"name": "chicken"}, ...]
     - RecipePairs: recipe["ingredients"] = ["chicken", ...]
+      (recipe["_ingredients_lower"] is used instead when load_recipes() added it)
     """
     if "graph" in recipe:
         # Toy format: graph with ingredient objects
         return {ing["name"].lower() for ing in recipe["graph"]["ingredients"]}
+    elif "_ingredients_lower" in recipe:
+        # RecipePairs format, lowercased once at load time
+        return set(recipe["_ingredients_lower"])
     elif "ingredients" in recipe:
         # RecipePairs format: flat list of strings
         return {ing.lower() for ing in recipe["ingredients"]}